@@ -0,0 +1,140 @@
+"""
+Import time benchmarks, what a short lived process (the wallfit command, a serverless handler) pays before it does any work.
+
+Every case runs in a fresh interpreter and reports how long its imports took,
+the number of modules it imported and which of the heavy optional ones were loaded.
+
+Usage:
+    python benchmarks/bench_import.py --output imports.json
+    python benchmarks/bench_import.py --baseline imports.json --threshold 0.2
+    python benchmarks/bench_import.py --cases fetcher --profile
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench_resize import compare
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = {
+    "package": "import wallfit",
+    "resize": "from wallfit import multi_monitor_resize",
+    "plan": "from wallfit import LayoutPlan; LayoutPlan([(1920, 1080)])",
+    "batch": "from wallfit import batch_resize",
+    "fetcher": "from wallfit import ImageFetcher",
+    "cli": "import wallfit.cli",
+}
+# Modules that should only be loaded by the cases that need them
+HEAVY_MODULES = ["PIL.Image", "requests", "urllib3", "asyncio", "multiprocessing", "concurrent.futures", "numpy"]
+
+# Runs in the fresh interpreter, prints the seconds spent on the statement and the modules it loaded
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def run_case(statement, env):
+    output = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement)], env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def run(cases, repeat):
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    # Warm up the OS file cache so that the first case doesn't pay for reading the modules from disk
+    for case in cases:
+        run_case(CASES[case], env)
+
+    results = {}
+    for case in cases:
+        runs = [run_case(CASES[case], env) for _ in range(repeat)]
+        modules = runs[0]["modules"]
+        times = [r["seconds"] for r in runs]
+        results[case] = {
+            "seconds": statistics.median(times),
+            "min_seconds": min(times),
+            "modules": len(modules),
+            "heavy_modules": [m for m in HEAVY_MODULES if m in modules],
+        }
+        print_result(case, results[case])
+    return results
+
+
+def profile(case):
+    # Prints the slowest imports of the case (cumulative, from python -X importtime), leaving out the ones
+    # the interpreter makes on startup anyway
+    startup = {name for _, _, name in import_times("pass")}
+    imports = [entry for entry in import_times(CASES[case]) if entry[2] not in startup]
+    print(f"slowest imports of {case}:")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:15]:
+        print(f"  {cumulative_us / 1000:8.1f} ms cumulative {self_us / 1000:8.1f} ms self  {name}")
+
+
+def import_times(statement):
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=env, cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us), int(self_us), name.strip()))
+    return imports
+
+
+def print_result(name, result):
+    heavy = ", ".join(result["heavy_modules"]) or "-"
+    print(f"{name:10} {result['seconds'] * 1000:8.1f} ms {result['modules']:5} modules  heavy: {heavy}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import time of wallfit")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=10, help="runs per case, the median is reported")
+    parser.add_argument("--profile", action="store_true", help="also list the slowest imports of every case")
+    parser.add_argument("--output", type=Path, help="save the results to this json file")
+    parser.add_argument("--baseline", type=Path, help="json file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown over the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.repeat)
+    if args.profile:
+        for case in args.cases:
+            profile(case)
+
+    if args.output:
+        report = {
+            "meta": {
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.4g} -> {new:.4g} ({(new / old - 1) * 100:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold * 100:.0f}% compared to {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Benchmarks of the resize pipeline on generated images (no network needed).
+
+Every case runs in a fresh process so that peak memory can be measured, and reports wall time,
+images/s, source megapixels/s and the peak memory growth of the process while fitting.
+
+Usage:
+    python benchmarks/bench_resize.py --output results.json
+    python benchmarks/bench_resize.py --baseline results.json --threshold 0.15
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Allow running the script straight from a checkout
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import PIL
+from PIL import Image, ImageChops
+from wallfit.image_resizer import fetch
+from wallfit.image_resizer.fetch import ImageFetcher
+from wallfit.image_resizer.plan import LayoutPlan
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is reported as null there
+    resource = None
+
+CASES = {
+    "single": {"resolutions": [(1920, 1080)]},
+    "gaps": {"resolutions": [(1920, 1080), (2560, 1440), (1920, 1080)], "gaps": [120, 120]},
+    "black_bars": {"resolutions": [(1080, 1920)], "black_bars": True},
+    "url": {"resolutions": [(1920, 1080)]},
+}
+SIZES = ["3000x2000", "6000x3000", "12000x4000"]
+FILTERS = ["bicubic", "lanczos", "bilinear"]
+
+
+def create_source(width, height):
+    # Colour blocks with a gradient on top, a bit of structure keeps the JPEG encoder honest
+    image = Image.new("RGB", (width, height))
+    colours = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+    block_width = width // len(colours)
+    for i, colour in enumerate(colours):
+        image.paste(colour, (i * block_width, 0, (i + 1) * block_width, height))
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    return ImageChops.multiply(image, gradient)
+
+
+def run_case(case, source_path, resample, repeat, queue):
+    # Runs in a fresh process, puts (times, peak memory growth in bytes) on the queue
+    plan = LayoutPlan(resample=resample, **CASES[case])
+
+    server = fetcher = None
+    if case == "url":
+        handler = functools.partial(QuietHandler, directory=str(source_path.parent))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/{source_path.name}"
+        # Fitted through the real url path (plan.fit -> LayoutPlan.load -> fetch_source) with a fetcher
+        # that doesn't cache, every run should download and decode
+        fetcher = ImageFetcher(max_cached=0)
+        fetch.default_fetcher = lambda: fetcher
+
+    reset_peak_memory()
+    memory_before = peak_memory()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan.fit(url if case == "url" else source_path)
+        times.append(time.perf_counter() - start)
+    memory_after = peak_memory()
+
+    if server is not None:
+        fetcher.close()
+        server.shutdown()
+    queue.put((times, None if memory_before is None else memory_after - memory_before))
+
+
+def reset_peak_memory():
+    # Linux keeps the peak of the process the benchmark was forked from, start counting from the current usage
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory():
+    # Peak resident memory of this process in bytes
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def run(cases, sizes, filters, repeat):
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            width, height = [int(v) for v in size.split("x")]
+            source_path = Path(directory) / f"source_{size}.jpg"
+            create_source(width, height).save(source_path, quality=90)
+
+            for case in cases:
+                for filter_name in filters:
+                    resample = Image.Resampling[filter_name.upper()]
+                    queue = context.Queue()
+                    process = context.Process(target=run_case, args=(case, source_path, resample, repeat, queue))
+                    process.start()
+                    times, memory = queue.get()
+                    process.join()
+
+                    median = statistics.median(times)
+                    name = f"{case}/{size}/{filter_name}"
+                    results[name] = {
+                        "seconds": median,
+                        "min_seconds": min(times),
+                        "images_per_second": 1 / median,
+                        "megapixels_per_second": width * height / 1e6 / median,
+                        "peak_memory_bytes": memory,
+                    }
+                    print_result(name, results[name])
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Returns the (case, metric, baseline value, new value) of every metric that got worse by more than threshold
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["seconds", "peak_memory_bytes"]:
+            old, new = baseline[name].get(metric), result.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def print_result(name, result):
+    memory = result["peak_memory_bytes"]
+    memory = "n/a" if memory is None else f"{memory / 1024 / 1024:.1f} MB"
+    print(f"{name:40} {result['seconds'] * 1000:9.1f} ms {result['images_per_second']:8.2f} img/s {result['megapixels_per_second']:8.1f} MP/s {memory:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wallfit resize pipeline")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="source sizes as WIDTHxHEIGHT")
+    parser.add_argument("--filters", nargs="+", default=FILTERS, choices=["nearest", "box", "bilinear", "hamming", "bicubic", "lanczos"])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the median is reported")
+    parser.add_argument("--output", type=Path, help="save the results to this json file")
+    parser.add_argument("--baseline", type=Path, help="json file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown or memory growth over the baseline (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.sizes, args.filters, args.repeat)
+
+    if args.output:
+        report = {
+            "meta": {
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.4g} -> {new:.4g} ({(new / old - 1) * 100:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold * 100:.0f}% compared to {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
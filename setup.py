@@ -1,7 +1,7 @@
 
 import setuptools
 
-with open("README.md", "r") as fh:
+with open("readme.md", "r") as fh:
     long_description = fh.read()
 
 with open("requirements.txt", "r") as fi:
@@ -14,7 +14,8 @@ setuptools.setup(
     description="Make any wallpaper fit your screen",
     long_description=long_description,      # Long description read from the the readme file
     long_description_content_type="text/markdown",
-    packages=["wallfit"],    # List of all python modules to be installed
+    packages=setuptools.find_packages(exclude=["tests", "tests.*", "benchmarks"]),    # List of all python modules to be installed
+    entry_points={"console_scripts": ["wallfit=wallfit.cli:main"]},    # The wallfit command
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
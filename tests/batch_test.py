@@ -0,0 +1,65 @@
+import io
+from PIL import Image
+from ..image_resizer.batch import batch_resize
+from ..image_resizer.encode import EncoderSettings
+from .resize_test import create_test_image
+
+
+def save_test_images(directory, count):
+    paths = []
+    image = create_test_image()
+    for i in range(count):
+        path = directory / f"source_{i}.png"
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def test_batch_resize_to_bytes(tmp_path):
+    sources = save_test_images(tmp_path, 3)
+    results = list(batch_resize(sources, resolutions=[(1920, 1080)], workers=2, chunk_size=2, format="PNG"))
+
+    assert sorted(r.index for r in results) == [0, 1, 2]
+    for result in results:
+        assert result.ok
+        assert result.source == sources[result.index]
+        image = Image.open(io.BytesIO(result.output))
+        assert image.size == (1920, 1080)
+
+
+def test_batch_resize_to_output_paths(tmp_path):
+    sources = save_test_images(tmp_path, 2)
+    outputs = [tmp_path / f"output_{i}.png" for i in range(2)]
+    results = list(batch_resize(sources, resolutions=[(1920, 1080), (1920, 1080)], output_paths=outputs, gaps=[100], workers=2))
+
+    for result in results:
+        assert result.ok
+        assert result.output == outputs[result.index]
+        assert Image.open(result.output).size == (3840, 1080)
+
+
+def test_batch_errors_are_kept_per_item(tmp_path):
+    sources = save_test_images(tmp_path, 2)
+    sources.insert(1, tmp_path / "missing.png")
+    results = {r.index: r for r in batch_resize(sources, resolutions=[(1920, 1080)], workers=2)}
+
+    assert results[0].ok
+    assert results[2].ok
+    assert not results[1].ok
+    assert isinstance(results[1].error, FileNotFoundError)
+    assert results[1].output is None
+
+
+def test_batch_resize_uses_the_encoder_format(tmp_path):
+    sources = save_test_images(tmp_path, 1)
+    encoder = EncoderSettings(format="JPEG", quality=50)
+    [result] = batch_resize(sources, resolutions=[(1920, 1080)], workers=1, encoder=encoder)
+    assert Image.open(io.BytesIO(result.output)).format == "JPEG"
+
+    # The encoder format wins over format, PNG without either
+    [result] = batch_resize(sources, resolutions=[(1920, 1080)], workers=1, format="WEBP", encoder=encoder)
+    assert Image.open(io.BytesIO(result.output)).format == "JPEG"
+    [result] = batch_resize(sources, resolutions=[(1920, 1080)], workers=1, format="WEBP")
+    assert Image.open(io.BytesIO(result.output)).format == "WEBP"
+    [result] = batch_resize(sources, resolutions=[(1920, 1080)], workers=1)
+    assert Image.open(io.BytesIO(result.output)).format == "PNG"
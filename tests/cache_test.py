@@ -0,0 +1,83 @@
+import io
+from PIL import Image
+from ..image_resizer.cache import FitCache
+from ..image_resizer.plan import LayoutPlan
+from .resize_test import create_test_image
+
+
+def test_cache_hit_skips_resize(tmp_path, monkeypatch):
+    source = tmp_path / "source.png"
+    create_test_image().save(source)
+    cache = FitCache(tmp_path / "cache")
+
+    first = cache.resize(source, resolutions=[(1920, 1080)], format="PNG")
+    assert cache.stats()["misses"] == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the image shouldn't be resized on a hit")
+    monkeypatch.setattr(LayoutPlan, "fit", fail)
+
+    second = cache.resize(source, resolutions=[(1920, 1080)], format="PNG", prefer_center=True)
+    assert bytes(first) == bytes(second)
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_key_includes_layout(tmp_path):
+    cache = FitCache(tmp_path)
+    key = cache.key("digest", LayoutPlan([(1920, 1080)]))
+    assert key == cache.key("digest", LayoutPlan([(1920, 1080)], gaps=[], prefer_center=True, resample=Image.Resampling.BICUBIC))
+    assert key != cache.key("digest", LayoutPlan([(1920, 1080)], prefer_left=True))
+    assert key != cache.key("digest", LayoutPlan([(1920, 1080)], resample=Image.Resampling.LANCZOS))
+    assert key != cache.key("digest", LayoutPlan([(1920, 1080)]), format="JPEG")
+    assert key != cache.key("digest", LayoutPlan([(1920, 1080), (1920, 1080)]))
+    assert key != cache.key("other digest", LayoutPlan([(1920, 1080)]))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = FitCache(tmp_path, max_bytes=250)
+    cache.put("a" * 64, b"a" * 100)
+    cache.put("b" * 64, b"b" * 100)
+    assert cache.get("a" * 64) is not None
+    cache.put("c" * 64, b"c" * 100)
+
+    assert cache.get("b" * 64) is None
+    assert bytes(cache.get("a" * 64)) == b"a" * 100
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+
+    # a new cache on the same directory picks up the remaining entries
+    reopened = FitCache(tmp_path, max_bytes=250)
+    assert reopened.stats()["entries"] == 2
+
+
+def test_cache_output_larger_than_cache(tmp_path):
+    source = tmp_path / "source.png"
+    create_test_image().save(source)
+    cache = FitCache(tmp_path / "cache", max_bytes=1000)
+
+    data = cache.resize(source, resolutions=[(1920, 1080)], format="PNG")
+    assert data is not None
+    assert Image.open(io.BytesIO(bytes(data))).size == (1920, 1080)
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_ignores_foreign_files(tmp_path):
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / "notes.txt").write_bytes(b"x" * 100)
+    (tmp_path / "ab" / ("cd" * 32)).write_bytes(b"x" * 100)
+    (tmp_path / "ab" / ("ab" * 32)).write_bytes(b"x" * 100)
+
+    cache = FitCache(tmp_path, max_bytes=50)
+    assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 1, "entries": 0, "bytes": 0}
+    assert (tmp_path / "ab" / "notes.txt").exists()
+    assert (tmp_path / "ab" / ("cd" * 32)).exists()
+
+
+def test_cache_converts_modes_the_format_cant_store(tmp_path):
+    source = tmp_path / "source.png"
+    create_test_image().convert("RGBA").save(source)
+    cache = FitCache(tmp_path / "cache")
+
+    data = cache.resize(source, resolutions=[(1920, 1080)], format="JPEG")
+    image = Image.open(io.BytesIO(bytes(data)))
+    assert (image.format, image.mode) == ("JPEG", "RGB")
@@ -0,0 +1,135 @@
+import json
+import os
+import pytest
+from PIL import Image
+from ..cli import MANIFEST_NAME, Manifest, changed_directories, directory_mtimes, load_layout, main, sync
+from ..image_resizer.encode import EncoderSettings
+from .resize_test import create_test_image
+
+
+def write_layout(path, **layout):
+    path.write_text(json.dumps(layout))
+    return path
+
+
+def run(source, output, layout):
+    manifest = Manifest(output / MANIFEST_NAME)
+    return sync(source, output, load_layout(layout), EncoderSettings(format="PNG"), manifest, workers=2)
+
+
+def test_cli(tmp_path):
+    source = tmp_path / "wallpapers"
+    (source / "nested").mkdir(parents=True)
+    image = create_test_image()
+    image.save(source / "a.png")
+    image.save(source / "nested" / "b.jpg")
+    (source / "notes.txt").write_text("not an image")
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1920, 1080]], resample="lanczos")
+
+    assert main([str(source), str(tmp_path / "fitted"), "--layout", str(layout), "--workers", "2"]) == 0
+    assert Image.open(tmp_path / "fitted" / "a.png.png").size == (1920, 1080)
+    assert Image.open(tmp_path / "fitted" / "nested" / "b.jpg.png").size == (1920, 1080)
+    assert set(json.loads((tmp_path / "fitted" / MANIFEST_NAME).read_text())["sources"]) == {"a.png", "nested/b.jpg"}
+
+
+def test_incremental_runs(tmp_path):
+    source = tmp_path / "wallpapers"
+    output = tmp_path / "fitted"
+    source.mkdir()
+    image = create_test_image()
+    for name in ["a.png", "b.png", "c.png"]:
+        image.save(source / name)
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1920, 1080]])
+
+    result = run(source, output, layout)
+    assert (result.processed, result.skipped) == (3, 0)
+    assert run(source, output, layout).skipped == 3
+
+    # Touched but unchanged files are hashed and skipped, changed ones fitted again
+    stat = os.stat(source / "a.png")
+    os.utime(source / "a.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    image.rotate(180).save(source / "b.png")
+    result = run(source, output, layout)
+    assert (result.processed, result.skipped) == (1, 2)
+    assert Image.open(output / "b.png.png").tobytes() != Image.open(output / "c.png.png").tobytes()
+
+    # Removed sources are dropped, a new layout fits everything again
+    (source / "c.png").unlink()
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1280, 1024]])
+    result = run(source, output, layout)
+    assert (result.processed, result.skipped, result.removed) == (2, 0, 1)
+    assert Image.open(output / "a.png.png").size == (1280, 1024)
+
+
+def test_sources_with_the_same_stem(tmp_path):
+    source = tmp_path / "wallpapers"
+    output = tmp_path / "fitted"
+    source.mkdir()
+    create_test_image().save(source / "a.png")
+    create_test_image().rotate(180).save(source / "a.jpg")
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1920, 1080]])
+
+    assert run(source, output, layout).processed == 2
+    assert Image.open(output / "a.png.png").tobytes() != Image.open(output / "a.jpg.png").tobytes()
+
+    # Pruning one source leaves the output of the other one alone
+    (source / "a.jpg").unlink()
+    manifest = Manifest(output / MANIFEST_NAME)
+    assert sync(source, output, load_layout(layout), EncoderSettings(format="PNG"), manifest, prune=True).removed == 1
+    assert not (output / "a.jpg.png").exists()
+    assert (output / "a.png.png").exists()
+
+
+def test_outputs_of_older_manifests_are_renamed(tmp_path):
+    source = tmp_path / "wallpapers"
+    output = tmp_path / "fitted"
+    source.mkdir()
+    create_test_image().save(source / "a.jpg")
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1920, 1080]])
+    run(source, output, layout)
+
+    # Outputs used to be named without the source extension
+    manifest = Manifest(output / MANIFEST_NAME)
+    manifest.sources["a.jpg"]["output"] = "a.png"
+    manifest.save()
+    os.replace(output / "a.jpg.png", output / "a.png")
+
+    assert run(source, output, layout).processed == 1
+    assert (output / "a.jpg.png").exists()
+    assert not (output / "a.png").exists()
+
+
+def test_output_format(tmp_path, capsys):
+    source = tmp_path / "wallpapers"
+    source.mkdir()
+    create_test_image().save(source / "a.png")
+    layout = write_layout(tmp_path / "layout.json", resolutions=[[1920, 1080]])
+
+    assert main([str(source), str(tmp_path / "fitted"), "--layout", str(layout), "--format", "jpg", "--workers", "1"]) == 0
+    assert Image.open(tmp_path / "fitted" / "a.png.jpeg").format == "JPEG"
+    with pytest.raises(SystemExit):
+        main([str(source), str(tmp_path / "fitted"), "--layout", str(layout), "--format", "nope"])
+    assert "can't write nope" in capsys.readouterr().err
+
+
+def test_changed_directories(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    mtimes = directory_mtimes(tmp_path)
+    assert changed_directories(mtimes) == ([], [])
+
+    create_test_image().save(tmp_path / "a" / "new.png")
+    (tmp_path / "b" / "sub").mkdir()
+    os.rmdir(tmp_path / "b" / "sub")
+    (tmp_path / "c" / "d").mkdir(parents=True)
+    # Make sure the timestamps differ on filesystems with a coarse mtime resolution
+    for directory in [tmp_path, tmp_path / "a", tmp_path / "b"]:
+        os.utime(directory, ns=(0, mtimes[directory] + 10 ** 9))
+    changed, removed = changed_directories(mtimes)
+    assert set(changed) == {tmp_path, tmp_path / "a", tmp_path / "b", tmp_path / "c", tmp_path / "c" / "d"}
+    assert removed == []
+
+    os.rmdir(tmp_path / "c" / "d")
+    os.rmdir(tmp_path / "c")
+    changed, removed = changed_directories(mtimes)
+    assert set(removed) == {tmp_path / "c", tmp_path / "c" / "d"}
@@ -0,0 +1,146 @@
+import asyncio
+import io
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image
+from ..image_resizer.fetch import ImageFetcher
+from ..image_resizer.plan import LayoutPlan
+from ..image_resizer.resizer import multi_monitor_resize
+from .resize_test import create_test_image
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    # Serves the same PNG on every path (a JPEG on .jpg paths, a BMP on /noise), supports conditional requests with an ETag
+    protocol_version = "HTTP/1.1"
+    body = None
+    jpeg_body = None
+    noise_body = None
+    requests_served = []
+
+    def do_GET(self):
+        etag = '"test-image"'
+        if self.headers.get("If-None-Match") == etag:
+            self.requests_served.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/missing"):
+            self.requests_served.append((self.path, 404))
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = self.jpeg_body if self.path.endswith(".jpg") else self.noise_body if self.path.startswith("/noise") else self.body
+        self.requests_served.append((self.path, 200))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg" if self.path.endswith(".jpg") else "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        if self.path.startswith("/etag"):
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    buffer = io.BytesIO()
+    create_test_image().save(buffer, format="PNG")
+    ImageHandler.body = buffer.getvalue()
+    buffer = io.BytesIO()
+    create_test_image().save(buffer, format="JPEG")
+    ImageHandler.jpeg_body = buffer.getvalue()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_image(server):
+    with ImageFetcher() as fetcher:
+        image = fetcher.fetch_image(f"{server}/image.png")
+    assert image.size == (6000, 2000)
+    assert image.getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_fetch_many(server):
+    async def fetch_all():
+        async with ImageFetcher(max_connections=2) as fetcher:
+            return await fetcher.fetch_many([f"{server}/{i}.png" for i in range(4)] + [f"{server}/missing.png"], return_exceptions=True)
+
+    results = asyncio.run(fetch_all())
+    assert [r.size for r in results[:4]] == [(6000, 2000)] * 4
+    assert results[4].response.status_code == 404
+
+
+def test_fetch_conditional_request(server):
+    with ImageFetcher() as fetcher:
+        first = fetcher.fetch_image(f"{server}/etag.png")
+        second = fetcher.fetch_image(f"{server}/etag.png")
+        assert fetcher.fetch_bytes(f"{server}/etag.png") == ImageHandler.body
+    # Only the encoded body is kept, every fetch decodes its own image
+    assert first is not second
+    assert first.tobytes() == second.tobytes()
+    assert ImageHandler.requests_served[-3:] == [("/etag.png", 200), ("/etag.png", 304), ("/etag.png", 304)]
+
+
+def test_fetch_cache_limits(server):
+    with ImageFetcher(max_cached_bytes=len(ImageHandler.body) * 2) as fetcher:
+        for i in range(3):
+            fetcher.fetch_bytes(f"{server}/etag{i}.png")
+        assert list(fetcher._validated) == [f"{server}/etag1.png", f"{server}/etag2.png"]
+    with ImageFetcher(max_cached_bytes=len(ImageHandler.body) - 1) as fetcher:
+        fetcher.fetch_image(f"{server}/etag.png")
+        assert len(fetcher._validated) == 0
+
+
+def test_resize_url(server):
+    image = multi_monitor_resize(fp=f"{server}/image.png", resolutions=[(1920, 1080)])
+    assert image.size == (1920, 1080)
+
+
+def test_fetch_source_keeps_large_jpegs_encoded(server):
+    with ImageFetcher() as fetcher:
+        # JPEGs that can be decoded at a reduced resolution are buffered for Image.open and draft
+        assert not isinstance(fetcher.fetch_source(f"{server}/photo.jpg", (640, 360)), Image.Image)
+        assert isinstance(fetcher.fetch_source(f"{server}/photo.jpg", (6000, 2000)), Image.Image)
+        # Other formats are decoded while they download
+        assert isinstance(fetcher.fetch_source(f"{server}/image.png", (640, 360)), Image.Image)
+        # Revalidated responses too
+        fetcher.fetch_source(f"{server}/etag.jpg", (640, 360))
+        assert not isinstance(fetcher.fetch_source(f"{server}/etag.jpg", (640, 360)), Image.Image)
+        assert ImageHandler.requests_served[-1] == ("/etag.jpg", 304)
+
+
+def test_url_jpeg_is_drafted(server):
+    plan = LayoutPlan([(640, 360)])
+    image, box = plan.load(f"{server}/photo.jpg")
+    # Decoded at a reduced resolution instead of the full 6000x2000
+    assert image.size[0] < 6000
+    assert plan.fit(f"{server}/photo.jpg").size == (640, 360)
+
+
+def test_fetch_source_doesnt_buffer_decoded_downloads(server):
+    # A few megabytes of BMP, which the parser decodes as it arrives
+    noise = io.BytesIO()
+    Image.effect_noise((1500, 1000), 64).convert("RGB").save(noise, format="BMP")
+    ImageHandler.noise_body = noise.getvalue()
+    with ImageFetcher() as fetcher:
+        tracemalloc.start()
+        try:
+            image = fetcher.fetch_source(f"{server}/noise.bmp", (640, 360))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    assert image.size == (1500, 1000)
+    # Chunks are dropped once the header shows the image is decoded while it downloads
+    assert peak < len(ImageHandler.noise_body) / 2
@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from .. import image_resizer
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+ROOT = Path(image_resizer.__file__).resolve().parents[2]
+
+
+def imported_modules(statement):
+    # Modules loaded by the statement in a fresh interpreter
+    probe = f"import json, sys\n{statement}\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return set(json.loads(output))
+
+
+def test_package_import_is_lazy():
+    modules = imported_modules(f"import {PACKAGE}")
+    assert "PIL.Image" not in modules
+    assert "requests" not in modules
+
+
+def test_network_stack_is_loaded_on_first_use():
+    modules = imported_modules(f"from {PACKAGE} import multi_monitor_resize, LayoutPlan, fit_monitors, instrument")
+    assert "PIL.Image" in modules
+    assert "requests" not in modules
+    assert "multiprocessing" not in modules
+
+    modules = imported_modules(f"from {PACKAGE} import ImageFetcher")
+    assert "requests" in modules
+
+
+def test_public_names():
+    package = sys.modules[PACKAGE]
+    for name in package.__all__:
+        assert getattr(package, name) is getattr(image_resizer, name)
+    assert "LayoutPlan" in dir(package)
+    with pytest.raises(AttributeError):
+        package.missing
@@ -0,0 +1,51 @@
+from ..image_resizer.batch import batch_resize
+from ..image_resizer.instrument import StageHistogram, instrument
+from ..image_resizer.resizer import multi_monitor_resize
+from .resize_test import create_test_image
+
+
+def test_instrument_reports_stages(tmp_path):
+    source = tmp_path / "source.png"
+    create_test_image().save(source)
+
+    calls = []
+    with instrument(calls.append):
+        multi_monitor_resize(fp=source, resolutions=[(1920, 1080), (1920, 1080)], gaps=[100], output_path=tmp_path / "output.png")
+
+    # nested calls (multi_monitor_resize -> plan.fit -> plan.apply) report once
+    assert len(calls) == 1
+    stages = [event.stage for event in calls[0]]
+    assert stages.count("resize") == 2
+    assert {"crop", "decode", "stitch", "save"} <= set(stages)
+
+    decode = [event for event in calls[0] if event.stage == "decode"][0]
+    assert decode.pixels == 6000 * 2000
+    assert decode.bytes == 6000 * 2000 * 4
+    assert all([event.seconds >= 0 for event in calls[0]])
+
+
+def test_instrument_disabled():
+    calls = []
+    with instrument(calls.append):
+        pass
+    multi_monitor_resize(fp=create_test_image(), resolutions=[(1920, 1080)])
+    assert calls == []
+
+
+def test_histogram_aggregates_batch(tmp_path):
+    sources = []
+    for i in range(3):
+        sources.append(tmp_path / f"source_{i}.png")
+        create_test_image().save(sources[-1])
+
+    histogram = StageHistogram()
+    with instrument(histogram):
+        results = list(batch_resize(sources, resolutions=[(1920, 1080)], workers=2))
+
+    assert all([result.stages for result in results])
+    assert histogram.calls == 3
+    summary = histogram.summary()
+    assert summary["resize"]["count"] == 3
+    assert summary["resize"]["pixels"] == 3 * 1920 * 1080
+    assert summary["decode"]["p95_seconds"] >= summary["decode"]["p50_seconds"]
+    assert sum(summary["decode"]["buckets"].values()) == 3
@@ -0,0 +1,117 @@
+import json
+import pickle
+import pytest
+from PIL import Image
+from ..cli import load_layout
+from ..image_resizer.layout import Monitor, PhysicalLayout
+from ..image_resizer.monitors import fit_monitors
+from ..image_resizer.plan import LayoutPlan
+from .resize_test import create_test_image
+
+
+def test_mixed_dpi_monitors():
+    # A 27" 1440p monitor next to a 24" 1080p one that is mounted 20mm lower
+    layout = PhysicalLayout([
+        Monitor((2560, 1440), position=(0, 0), size=(597, 336)),
+        Monitor((1920, 1080), position=(610, 20), size=(531, 299)),
+    ])
+    assert layout.physical_size == (1141, 336)
+    image = create_test_image()
+    box = layout.box(image.size)
+    (left_box, left_offset, left_size), (right_box, right_offset, right_size) = layout.regions(box)
+
+    # Every monitor shows the part of the image that is physically in front of it at its own resolution
+    scale = (box[2] - box[0]) / 1141
+    assert left_box[2] - left_box[0] == pytest.approx(597 * scale)
+    assert right_box[0] - box[0] == pytest.approx(610 * scale)
+    assert right_box[1] - box[1] == pytest.approx(20 * scale)
+    assert (left_size, right_size) == ((2560, 1440), (1920, 1080))
+
+    left, right = fit_monitors(image, layout)
+    assert left.size == (2560, 1440)
+    assert right.size == (1920, 1080)
+
+    # The stitched desktop places the monitors at their physical position at the highest density
+    output = layout.apply(image)
+    assert left_offset == (0, 0)
+    assert right_offset == (round(610 * 2560 / 597), round(20 * 2560 / 597))
+    assert output.size == (right_offset[0] + 1920, 1440)
+    assert output.crop((right_offset[0], right_offset[1], right_offset[0] + 1920, right_offset[1] + 1080)).tobytes() == right.tobytes()
+
+
+def test_monitors_are_not_resized_from_each_other():
+    # Two monitors of the same physical size, one with twice the pixel density
+    layout = PhysicalLayout([
+        Monitor((3840, 2160), position=(0, 0), dpi=163),
+        Monitor((1920, 1080), position=(3840 / 163 * 25.4, 0), dpi=81.5),
+    ], resample=Image.Resampling.BOX)
+    image = create_test_image()
+    box = layout.box(image.size)
+    dense_box, sparse_box = [region[0] for region in layout.regions(box)]
+    assert dense_box[2] - dense_box[0] == pytest.approx(sparse_box[2] - sparse_box[0])
+
+    dense, sparse = fit_monitors(image, layout)
+    assert dense.size == (3840, 2160)
+    assert sparse.size == (1920, 1080)
+    # The source is decoded at the resolution of the dense monitor
+    assert layout.box_size == (7680, 2160)
+
+
+def test_grid_layout():
+    layout = PhysicalLayout([
+        Monitor((1920, 1080), position=(0, 0), size=(520, 290)),
+        Monitor((1920, 1080), position=(530, 0), size=(520, 290)),
+        Monitor((1920, 1080), position=(0, 300), size=(520, 290)),
+        Monitor((1920, 1080), position=(530, 300), size=(520, 290)),
+    ], prefer_center=True)
+    box = layout.box(create_test_image().size)
+    regions = layout.regions(box)
+    assert regions[3][0][2] == pytest.approx(box[2])
+    assert regions[3][0][3] == pytest.approx(box[3])
+    assert regions[2][0][1] > regions[0][0][3]
+
+    output = layout.apply(create_test_image())
+    assert output.size == (regions[1][1][0] + 1920, regions[2][1][1] + 1080)
+    assert pickle.loads(pickle.dumps(layout)) == layout
+
+
+def test_desktop_offsets():
+    layout = PhysicalLayout([
+        Monitor((1920, 1080), position=(0, 0), dpi=96, offset=(-1920, 0)),
+        Monitor((1920, 1080), position=(520, 0), dpi=96, offset=(0, 0)),
+    ])
+    assert [region[1] for region in layout.regions(layout.box((4000, 1000)))] == [(0, 0), (1920, 0)]
+    assert layout.size == (3840, 1080)
+
+    left, right = fit_monitors(create_test_image(), layout)
+    output = layout.apply(create_test_image())
+    assert output.crop((1920, 0, 3840, 1080)).tobytes() == right.tobytes()
+    assert output.crop((0, 0, 1920, 1080)).tobytes() == left.tobytes()
+
+
+def test_physical_layout_validation(tmp_path):
+    with pytest.raises(ValueError):
+        PhysicalLayout([Monitor((1920, 1080))])
+    with pytest.raises(ValueError):
+        PhysicalLayout([Monitor((1920, 1080), dpi=96), Monitor((1920, 1080), position=(100, 100), dpi=96)])
+    with pytest.raises(ValueError):
+        PhysicalLayout([])
+
+    layout_path = tmp_path / "layout.json"
+    layout_path.write_text(json.dumps({"monitors": [{"resolution": [2560, 1440], "size": [597, 336]}, {"resolution": [1920, 1080], "position": [610, 20], "dpi": 92}]}))
+    layout = load_layout(layout_path)
+    assert layout.resolutions == ((2560, 1440), (1920, 1080))
+    layout_path.write_text(json.dumps({"monitors": [{"resolution": [1920, 1080], "dpi": 96}], "gaps": [10]}))
+    with pytest.raises(ValueError):
+        load_layout(layout_path)
+
+
+def test_layout_plan_attributes():
+    # Two monitors in a row at one pixel per millimetre, placed on the desktop without the gap
+    layout = PhysicalLayout([
+        Monitor((1920, 1080), position=(0, 0), size=(1920, 1080), offset=(0, 0)),
+        Monitor((1920, 1080), position=(2020, 0), size=(1920, 1080), offset=(1920, 0)),
+    ])
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[100])
+    for name in ["width_with_gaps", "target_height", "monitors_width", "monitors", "box_size", "size", "target_aspect_ratio"]:
+        assert getattr(layout, name) == getattr(plan, name)
@@ -0,0 +1,50 @@
+from PIL import Image, ImageChops, ImageStat
+from ..image_resizer.encode import EncoderSettings
+from ..image_resizer.monitors import fit_monitors
+from ..image_resizer.plan import LayoutPlan
+from .resize_test import create_test_image
+
+
+def test_fit_monitors_with_gaps(tmp_path):
+    image = create_test_image()
+    plan = LayoutPlan([(1920, 1080), (2560, 1080), (1920, 1080)], gaps=[150, 150])
+    outputs = [tmp_path / f"monitor_{i}.png" for i in range(3)]
+    monitors = fit_monitors(image, plan, output_paths=outputs)
+
+    # every monitor is exactly the matching part of the stitched output
+    stitched = plan.apply(image)
+    x = 0
+    for monitor, output, resolution in zip(monitors, outputs, plan.resolutions):
+        assert monitor.size == resolution
+        assert Image.open(output).size == resolution
+        assert monitor.tobytes() == stitched.crop((x, 0, x + resolution[0], resolution[1])).tobytes()
+        x += resolution[0]
+
+
+def test_fit_monitors_without_gaps():
+    image = create_test_image()
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)])
+    left, right = fit_monitors(image, plan, workers=1)
+
+    stitched = plan.apply(image)
+    difference = ImageStat.Stat(ImageChops.difference(right, stitched.crop((1920, 0, 3840, 1080)))).mean
+    assert max(difference) < 1
+    assert left.getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_encoder_settings(tmp_path):
+    image = create_test_image()
+    gradient = Image.linear_gradient("L").resize(image.size).convert("RGB")
+    image = ImageChops.multiply(image, gradient)
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[100])
+
+    high = [tmp_path / "high_0.jpg", tmp_path / "high_1.jpg"]
+    low = [tmp_path / "low_0.jpg", tmp_path / "low_1.jpg"]
+    fit_monitors(image, plan, high, EncoderSettings(quality=95, subsampling="4:4:4"))
+    fit_monitors(image, plan, low, EncoderSettings(quality=30, progressive=True))
+    assert low[0].stat().st_size < high[0].stat().st_size
+    assert Image.open(low[0]).info.get("progressive")
+    assert not Image.open(high[0]).info.get("progressive")
+
+    assert EncoderSettings(compress_level=1).options("png") == {"compress_level": 1, "optimize": False}
+    assert EncoderSettings(quality=80, method=6).options("WEBP") == {"quality": 80, "method": 6, "lossless": False}
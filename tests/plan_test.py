@@ -0,0 +1,71 @@
+import pickle
+import pytest
+from PIL import Image
+from ..image_resizer.plan import LayoutPlan, resample_box, resample_region
+from ..image_resizer.resizer import multi_monitor_resize
+from .resize_test import create_test_image
+
+
+def test_plan_precomputes_layout():
+    plan = LayoutPlan([(1920, 1080), (2560, 1440), (1920, 1080)], gaps=[100, 50])
+    assert plan.mode == "prefer_center"
+    assert plan.size == (6400, 1080)
+    assert plan.width_with_gaps == 6550
+    assert plan.monitors == ((0, 0, 1920), (2020, 1920, 2560), (4630, 4480, 1920))
+
+
+def test_plan_matches_multi_monitor_resize():
+    image = create_test_image()
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[200], prefer_top=True)
+    expected = multi_monitor_resize(fp=image, resolutions=[(1920, 1080), (1920, 1080)], gaps=[200], prefer_top=True)
+    assert plan.apply(image).tobytes() == expected.tobytes()
+
+
+def test_plan_pickles():
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[20], black_bars=True)
+    copy = pickle.loads(pickle.dumps(plan))
+    assert copy == plan
+    assert hash(copy) == hash(plan)
+    assert copy.monitors == plan.monitors
+    assert copy != LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[20])
+
+
+def test_plan_validates_layout():
+    with pytest.raises(ValueError):
+        LayoutPlan([(1920, 1080)], gaps=[20])
+    with pytest.raises(ValueError):
+        LayoutPlan([(1920, 1080)], prefer_left=True, prefer_right=True)
+
+
+def test_black_bars_are_not_resampled():
+    # A wide source on tall monitors, most of every monitor is black bars
+    image = create_test_image().resize((3000, 500))
+    plan = LayoutPlan([(1080, 1920), (1080, 1920)], gaps=[60], black_bars=True)
+    box = plan.box(image.size)
+    output = plan.render(image, box)
+
+    expected = Image.new("RGB", plan.size)
+    for source_box, position, size in plan.regions(box):
+        expected.paste(resample_box(image, source_box, size), position)
+    assert output.tobytes() == expected.tobytes()
+    assert output.getpixel((0, 0)) == (0, 0, 0)
+
+    part, offset = resample_region(image, box, (2220, 1920))
+    assert offset[0] == 0 and offset[1] > 0
+    assert part.size[1] == 1920 - 2 * offset[1]
+    assert resample_region(image, (-200, 0, -100, 100), (100, 100)) == (None, (0, 0))
+
+
+def test_black_bars_of_palette_sources():
+    # Red on top of green, palette index 0 is red so the bars can't just be index 0
+    source = Image.new("RGB", (3000, 1000), (255, 0, 0))
+    source.paste((0, 255, 0), (0, 500, 3000, 1000))
+    source = source.quantize(2)
+    image = multi_monitor_resize(source, resolutions=[(1920, 1080)], black_bars=True)
+    colors = {color for _, color in image.convert("RGB").getcolors()}
+    assert {(255, 0, 0), (0, 255, 0), (0, 0, 0)} <= colors
+    assert image.convert("RGB").getpixel((0, 0)) == (0, 0, 0)
+
+    part = resample_box(source, (0, -500, 3000, 1500), (1920, 1280))
+    assert part.convert("RGB").getpixel((960, 640 - 200)) == (255, 0, 0)
+    assert part.convert("RGB").getpixel((960, 0)) == (0, 0, 0)
@@ -0,0 +1,39 @@
+from PIL import Image, ImageChops, ImageStat
+from ..image_resizer.instrument import instrument
+from ..image_resizer.plan import LayoutPlan
+from ..image_resizer.render import render_layouts
+from .resize_test import create_test_image
+
+
+def test_render_layouts_decodes_once(tmp_path):
+    path = tmp_path / "source.jpg"
+    create_test_image().resize((12000, 4000)).save(path, quality=95)
+    plans = [
+        LayoutPlan([(3840, 2160)]),
+        LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[100]),
+        LayoutPlan([(640, 360)], black_bars=True),
+        LayoutPlan([(320, 180)], prefer_left=True),
+    ]
+    outputs = [tmp_path / f"output_{i}.png" for i in range(len(plans))]
+
+    calls = []
+    with instrument(calls.append):
+        images = render_layouts(path, plans, output_paths=outputs)
+    assert len(calls) == 1
+    assert [event.stage for event in calls[0]].count("decode") == 1
+
+    for plan, image, output in zip(plans, images, outputs):
+        assert image.size == plan.size
+        assert Image.open(output).size == plan.size
+        # the pyramid levels give the same result as fitting the source separately
+        expected = plan.fit(path)
+        difference = ImageStat.Stat(ImageChops.difference(image, expected)).mean
+        assert max(difference) < 2
+
+
+def test_render_layouts_image():
+    image = create_test_image()
+    plans = [LayoutPlan([(1920, 1080)]), LayoutPlan([(100, 50)])]
+    outputs = render_layouts(image, plans)
+    assert [o.size for o in outputs] == [(1920, 1080), (100, 50)]
+    assert outputs[1].getpixel((0, 0)) == (255, 0, 0)
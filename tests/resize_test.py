@@ -1,5 +1,6 @@
-from PIL import Image
+from PIL import Image, ImageChops, ImageStat
 from ..image_resizer.resizer import multi_monitor_resize
+from ..image_resizer.plan import draft_box
 
 def create_test_image() -> Image:
     """
@@ -294,4 +295,52 @@ def test_gaps():
 def test_url():
     url = "https://i.redd.it/can-someone-covert-this-wallpaper-to-5120x1440p-plz-v0-0797jqzt56vb1.jpg?s=42606379c8e35aac42d46e401bc0b0802d17477a"
     image = multi_monitor_resize(fp=url, resolutions=[(5120, 1440)], prefer_top=True)
-    image.show()
\ No newline at end of file
+    image.show()
+
+def test_jpeg_draft_decode(tmp_path):
+    # A large JPEG source should be decoded at a reduced size and still give the same result as a full decode
+    source = create_test_image().resize((12000, 4000))
+    path = tmp_path / "source.jpg"
+    source.save(path, quality=95)
+
+    image = multi_monitor_resize(fp=path, resolutions=[(1920, 1080)])
+    assert image.size == (1920, 1080)
+
+    # 1080 out of 4000 rows are needed so the image can be decoded at half of the resolution
+    drafted = Image.open(path)
+    box = draft_box(drafted, (2444, 0, 9556, 4000), (1920, 1080))
+    assert drafted.size == (6000, 2000)
+    assert box == (1222, 0, 4778, 2000)
+
+    full_image = multi_monitor_resize(fp=Image.open(path), resolutions=[(1920, 1080)])
+    difference = ImageStat.Stat(ImageChops.difference(image, full_image)).mean
+    assert max(difference) < 2
+
+
+def test_gaps_match_full_width_resize():
+    # Resizing every monitor separately should give the same result as resizing the image with gaps and cutting them out
+    old_image = create_test_image()
+    image = multi_monitor_resize(fp=old_image, resolutions=[(1920, 1080), (1920, 1080), (1920, 1080)], gaps=[300, 150])
+    assert image.size == (5760, 1080)
+
+    full_image = multi_monitor_resize(fp=old_image, resolutions=[(6210, 1080)])
+    expected = Image.new("RGB", (5760, 1080))
+    expected.paste(full_image.crop((0, 0, 1920, 1080)), (0, 0))
+    expected.paste(full_image.crop((2220, 0, 4140, 1080)), (1920, 0))
+    expected.paste(full_image.crop((4290, 0, 6210, 1080)), (3840, 0))
+    difference = ImageStat.Stat(ImageChops.difference(image, expected)).mean
+    assert max(difference) < 1
+
+
+def test_gaps_black_bars():
+    old_image = create_test_image()
+    image = multi_monitor_resize(fp=old_image, resolutions=[(1080, 1920), (1080, 1920)], gaps=[100], black_bars=True)
+    assert image.size == (2160, 1920)
+
+    # the image is much wider than the monitors so there should be black bars on the top and bottom of both monitors
+    sizing_factor = 2260 / old_image.size[0]
+    missing_height = 1920 - old_image.size[1] * sizing_factor
+    mixing_tolerance = 4 # the amount of pixels that we tolerate to be mixed up because of colour transitions
+    for x in [0, 1079, 1080, 2159]:
+        black_pixels = sum([1 for y in range(image.size[1]) if image.getpixel((x, y)) == (0, 0, 0)])
+        assert abs(missing_height - black_pixels) <= mixing_tolerance
@@ -0,0 +1,91 @@
+import os
+from PIL import Image, ImageDraw
+from ..image_resizer import saliency
+from ..image_resizer.layout import Monitor, PhysicalLayout
+from ..image_resizer.plan import LayoutPlan
+from ..image_resizer.render import render_layouts
+from ..image_resizer.resizer import multi_monitor_resize
+from ..image_resizer.saliency import best_window, edge_profiles, salient_box
+from .resize_test import create_test_image
+
+
+def create_subject_image(size, subject_box):
+    # Flat background with a checkered subject in it
+    image = Image.new("RGB", size, (40, 90, 160))
+    draw = ImageDraw.Draw(image)
+    x0, y0, x1, y1 = subject_box
+    for x in range(x0, x1, 40):
+        for y in range(y0, y1, 40):
+            if (x // 40 + y // 40) % 2 == 0:
+                draw.rectangle((x, y, x + 39, y + 39), fill=(250, 240, 220))
+    return image
+
+
+def test_best_window():
+    assert best_window([0, 0, 0, 0, 5, 5], 2 / 6) == 4 / 6
+    assert best_window([5, 5, 0, 0, 0, 0], 2 / 6) == 0
+    # Flat profiles stay centered
+    assert best_window([1] * 10, 0.5) == 0.25
+
+
+def test_salient_crop_follows_the_subject():
+    image = create_subject_image((6000, 2000), (4900, 600, 5900, 1600))
+    output = multi_monitor_resize(image, resolutions=[(1920, 1080)], prefer_salient=True)
+    centered = multi_monitor_resize(image, resolutions=[(1920, 1080)])
+    # The subject is in the right hand part of the source, a centered crop misses it
+    assert output.getextrema()[0][1] >= 240
+    assert centered.getextrema()[0][1] < 240
+
+    # Tall sources are cropped vertically
+    image = create_subject_image((2000, 6000), (400, 300, 1600, 1000))
+    plan = LayoutPlan([(1920, 1080)], prefer_salient=True)
+    box = plan.prepare(image)
+    assert box[0] == 0 and box[2] == 2000
+    assert box[1] < 300 and box[3] > 1000
+
+
+def test_profiles_are_cached_per_source(tmp_path):
+    path = tmp_path / "subject.png"
+    create_subject_image((3000, 1000), (200, 100, 800, 900)).save(path)
+    saliency._profiles.clear()
+
+    plans = [LayoutPlan([(1920, 1080)], prefer_salient=True), LayoutPlan([(1080, 1920)], prefer_salient=True), LayoutPlan([(1920, 1080)])]
+    outputs = render_layouts(str(path), plans)
+    assert len(saliency._profiles) == 1
+    profiles = next(iter(saliency._profiles.values()))
+
+    # Later fits of the same file reuse the profiles
+    plans[0].fit(str(path))
+    assert len(saliency._profiles) == 1
+    assert edge_profiles(Image.open(path), saliency.source_key(str(path))) is profiles
+    assert outputs[0].tobytes() == plans[0].fit(str(path)).tobytes()
+
+
+def test_bytes_sources_are_keyed_as_paths(tmp_path):
+    # Image.open reads bytes as a file path, editing the file has to invalidate its profiles
+    path = tmp_path / "subject.png"
+    create_subject_image((3000, 1000), (200, 100, 800, 900)).save(path)
+    plan = LayoutPlan([(1080, 1080)], prefer_salient=True)
+    assert saliency.source_key(bytes(path)) == saliency.source_key(str(path))
+    assert plan.fit(bytes(path)).tobytes() == plan.fit(create_subject_image((3000, 1000), (200, 100, 800, 900))).tobytes()
+
+    create_subject_image((3000, 1000), (2200, 100, 2800, 900)).save(path)
+    os.utime(path, ns=(0, 0))
+    assert plan.fit(bytes(path)).tobytes() == plan.fit(create_subject_image((3000, 1000), (2200, 100, 2800, 900))).tobytes()
+
+
+def test_salient_box_keeps_box_size():
+    image = create_subject_image((1000, 500), (0, 0, 100, 500))
+    box = salient_box(image, (250, 0, 750, 500))
+    assert box == (0, 0, 500, 500)
+    assert salient_box(image, (0, 0, 1000, 500)) == (0, 0, 1000, 500)
+
+
+def test_positional_arguments_keep_their_meaning(tmp_path):
+    # prefer_salient was added after the existing parameters, callers passing them by position are unaffected
+    image = create_test_image()
+    multi_monitor_resize(image, [(1920, 1080)], None, False, True, False, False, False, False, tmp_path / "output.png")
+    assert Image.open(tmp_path / "output.png").size == (1920, 1080)
+    assert LayoutPlan([(1920, 1080)], None, False, True, False, False, False, False, Image.Resampling.LANCZOS).resample == Image.Resampling.LANCZOS
+    layout = PhysicalLayout([Monitor((1920, 1080), dpi=96)], False, True, False, False, False, False, Image.Resampling.LANCZOS)
+    assert layout.resample == Image.Resampling.LANCZOS
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import pytest
+from PIL import Image
+from ..image_resizer.plan import LayoutPlan
+from ..image_resizer.service import FitClient, FitServer
+from .resize_test import create_test_image
+
+
+def test_service_fits_sources(tmp_path):
+    path = tmp_path / "source.jpg"
+    create_test_image().save(path)
+    plans = [LayoutPlan([(1920, 1080)]), LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[100], prefer_salient=True)]
+
+    with FitServer(workers=1) as server:
+        with FitClient(server.address, server.authkey) as client:
+            for plan in plans:
+                image = client.fit(str(path), plan)
+                assert image.tobytes() == plan.fit(str(path)).tobytes()
+
+            # The second layout reuses the decoded source
+            assert client.fit(path.read_bytes(), plans[0]).size == (1920, 1080)
+            client.fit(str(path), plans[0], output_path=tmp_path / "output.png")
+            assert (tmp_path / "output.png").exists()
+
+            with pytest.raises(FileNotFoundError):
+                client.fit(str(tmp_path / "missing.jpg"), plans[0])
+            with pytest.raises(ValueError):
+                client.fit(create_test_image(), plans[0])
+
+            stats = client.stats()
+            assert stats["completed"] == 4
+            assert stats["failed"] == 1
+            assert stats["cache_hits"] >= 2
+            # Every result block was released by the client
+            assert stats["outstanding"] == 0
+
+
+def test_service_backpressure(tmp_path):
+    path = tmp_path / "source.png"
+    create_test_image().save(path)
+    plan = LayoutPlan([(3840, 2160)])
+    results = []
+
+    def fit(address, authkey):
+        with FitClient(address, authkey) as client:
+            try:
+                results.append(client.fit(str(path), plan).size)
+            except queue.Full:
+                results.append("rejected")
+
+    with FitServer(workers=1, queue_size=1, submit_timeout=0.01, cache_bytes=0) as server:
+        threads = [threading.Thread(target=fit, args=(server.address, server.authkey)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = server.stats()
+
+    assert "rejected" in results
+    assert (3840, 2160) in results
+    assert stats["rejected"] == results.count("rejected")
+    assert stats["outstanding"] == 0
+
+
+def test_service_rejects_unknown_clients():
+    with FitServer(workers=1) as server:
+        with pytest.raises(multiprocessing.AuthenticationError):
+            FitClient(server.address, b"wrong key")
+        # The server keeps serving the clients that know the key
+        with FitClient(server.address, server.authkey) as client:
+            assert client.stats()["submitted"] == 0
+
+
+def test_service_keeps_palettes(tmp_path):
+    path = tmp_path / "palette.png"
+    Image.new("RGB", (3000, 1000), (255, 0, 0)).convert("P").save(path)
+    path_1 = tmp_path / "bilevel.png"
+    Image.new("1", (3000, 1000), 1).save(path_1)
+    plan = LayoutPlan([(1920, 1080)])
+
+    with FitServer(workers=1) as server:
+        with FitClient(server.address, server.authkey) as client:
+            for source in [path, path_1]:
+                image = client.fit(str(source), plan)
+                expected = plan.fit(str(source))
+                assert image.mode == expected.mode
+                assert image.convert("RGB").tobytes() == expected.convert("RGB").tobytes()
+            assert client.fit(str(path), plan).convert("RGB").getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_service_survives_a_killed_worker(tmp_path):
+    # Opening a fifo blocks until someone writes to it, the worker is stuck in the middle of the job
+    fifo = tmp_path / "source.png"
+    os.mkfifo(fifo)
+    path = tmp_path / "source.jpg"
+    create_test_image().save(path)
+    plan = LayoutPlan([(1920, 1080)])
+    errors = []
+
+    def fit(address, authkey):
+        with FitClient(address, authkey) as client:
+            try:
+                client.fit(str(fifo), plan)
+            except RuntimeError as e:
+                errors.append(e)
+
+    with FitServer(workers=1) as server:
+        thread = threading.Thread(target=fit, args=(server.address, server.authkey))
+        thread.start()
+        deadline = time.monotonic() + 10
+        while server.stats()["running"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.stats()["running"] == 1
+
+        [worker] = [p for p in multiprocessing.active_children() if p.name == "wallfit-worker"]
+        os.kill(worker.pid, signal.SIGKILL)
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+        assert len(errors) == 1
+
+        # The worker was replaced
+        with FitClient(server.address, server.authkey) as client:
+            assert client.fit(str(path), plan).size == (1920, 1080)
+            stats = client.stats()
+        assert (stats["failed"], stats["completed"], stats["running"]) == (1, 1, 0)
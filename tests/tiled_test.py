@@ -0,0 +1,84 @@
+import pytest
+from PIL import Image, ImageChops, ImageStat
+from ..image_resizer import tiled
+from ..image_resizer.plan import LayoutPlan
+from ..image_resizer.resizer import multi_monitor_resize
+from .resize_test import create_test_image
+
+
+def create_large_image():
+    # The test image with a gradient over it so that strip seams would show up
+    image = create_test_image()
+    gradient = Image.linear_gradient("L").resize(image.size).convert("RGB")
+    return ImageChops.multiply(image, gradient)
+
+
+@pytest.mark.parametrize("name, save_kwargs", [
+    ("source.bmp", {}),
+    ("source.ppm", {}),
+    ("source.tif", {}),
+    ("strips.tif", {"tiffinfo": {278: 32}}),
+])
+def test_tiled_matches_full_decode(tmp_path, monkeypatch, name, save_kwargs):
+    path = tmp_path / name
+    source = create_large_image()
+    source.save(path, **save_kwargs)
+
+    strips = []
+    load_strip = tiled.load_strip
+    monkeypatch.setattr(tiled, "load_strip", lambda *args: strips.append(args[2]) or load_strip(*args))
+
+    plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[150], prefer_top=True)
+    # 4MB is about a tenth of the decoded source
+    image = tiled.tiled_fit(path, plan, max_memory=plan.size[0] * plan.size[1] * 4 + 4 * 1024 * 1024)
+    assert image.size == plan.size
+    assert len(strips) > 5
+    # only the needed rows of the source are decoded
+    assert max([bottom - top for _, top, _, bottom in strips]) < 1000
+
+    expected = plan.apply(source)
+    difference = ImageStat.Stat(ImageChops.difference(image, expected)).mean
+    assert max(difference) < 1
+
+
+def test_tiled_black_bars(tmp_path):
+    path = tmp_path / "source.bmp"
+    source = create_large_image()
+    source.save(path)
+
+    plan = LayoutPlan([(1080, 1920)], black_bars=True)
+    image = tiled.tiled_fit(path, plan, max_memory=16 * 1024 * 1024)
+    expected = plan.apply(source)
+    difference = ImageStat.Stat(ImageChops.difference(image, expected)).mean
+    assert max(difference) < 1
+
+
+def test_tiled_memory_limit(tmp_path):
+    path = tmp_path / "source.png"
+    create_large_image().save(path)
+    plan = LayoutPlan([(1920, 1080)])
+
+    # PNGs can't be read in strips, they are decoded as a whole if that fits
+    assert tiled.tiled_fit(path, plan, max_memory=256 * 1024 * 1024).size == (1920, 1080)
+    with pytest.raises(ValueError):
+        tiled.tiled_fit(path, plan, max_memory=16 * 1024 * 1024)
+    with pytest.raises(ValueError):
+        tiled.tiled_fit(path, plan, max_memory=1024)
+
+
+def test_resize_with_max_memory(tmp_path):
+    path = tmp_path / "source.bmp"
+    create_large_image().save(path)
+    image = multi_monitor_resize(fp=path, resolutions=[(1920, 1080)], max_memory=32 * 1024 * 1024)
+    assert image.size == (1920, 1080)
+
+
+def test_tiles_are_plain_tuples(tmp_path, monkeypatch):
+    path = tmp_path / "source.bmp"
+    create_large_image().save(path)
+    tiles = tiled.strip_tiles(Image.open(path))
+    assert all([type(tile) is tuple and len(tile) == 4 for tile in tiles])
+
+    # Without the decoder factory strips can't be read
+    monkeypatch.delattr(Image, "_getdecoder")
+    assert tiled.strip_tiles(Image.open(path)) is None
@@ -1 +1,21 @@
-from .image_resizer import multi_monitor_resize
\ No newline at end of file
+from typing import TYPE_CHECKING
+
+# Same names as wallfit.image_resizer, loaded from there on first use (see image_resizer/__init__.py)
+__all__ = ["multi_monitor_resize", "LayoutPlan", "Monitor", "PhysicalLayout", "render_layouts", "tiled_fit", "fit_monitors", "EncoderSettings", "batch_resize", "BatchResult", "FitCache", "ImageFetcher", "FitServer", "FitClient", "instrument", "StageEvent", "StageHistogram"]
+
+if TYPE_CHECKING:
+    from .image_resizer import multi_monitor_resize, LayoutPlan, Monitor, PhysicalLayout, render_layouts, tiled_fit, fit_monitors, EncoderSettings, batch_resize, BatchResult, FitCache, ImageFetcher, FitServer, FitClient, instrument, StageEvent, StageHistogram
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from . import image_resizer
+
+    value = getattr(image_resizer, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,349 @@
+"""
+wallfit command line tool, fits a folder of wallpapers to a monitor layout.
+
+Sources that were already fitted with the same layout are skipped. What was done is recorded in a manifest
+in the output folder: the size, modification time and content hash of every source and a hash of the layout.
+A source whose size and modification time didn't change is skipped without reading it, otherwise it's hashed
+and only fitted again if its content or the layout changed.
+
+Usage:
+    wallfit wallpapers/ fitted/ --layout layout.json
+    wallfit wallpapers/ fitted/ --layout layout.json --format jpeg --quality 90 --watch
+
+layout.json holds the arguments of LayoutPlan:
+    {"resolutions": [[1920, 1080], [2560, 1440]], "gaps": [40], "prefer_center": true, "resample": "lanczos"}
+or of PhysicalLayout, with the Monitor arguments of every monitor:
+    {"monitors": [{"resolution": [2560, 1440], "size": [597, 336]}, {"resolution": [1920, 1080], "position": [610, 60], "dpi": 92}]}
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from PIL import Image
+from .image_resizer.encode import EncoderSettings
+from .image_resizer.layout import Monitor, PhysicalLayout
+from .image_resizer.plan import MODES, LayoutPlan
+
+MANIFEST_NAME = ".wallfit-manifest.json"
+MANIFEST_VERSION = 1
+# The manifest is saved every so many fitted sources so that an interrupted run doesn't start over
+SAVE_EVERY = 100
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SyncResult:
+    """
+    Counts of a single sync run.
+    deferred holds the directories with files that were still being written, they should be synced again later.
+    """
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    removed: int = 0
+    deferred: list = field(default_factory=list)
+
+
+class Manifest:
+    # Sources fitted so far: relative source path -> size, mtime_ns, digest, layout hash and relative output path
+    def __init__(self, path):
+        self.path = Path(path)
+        self.sources = {}
+        try:
+            data = json.loads(self.path.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                self.sources = data["sources"]
+        except (OSError, ValueError, KeyError):
+            # Missing or unreadable manifest, everything is fitted again
+            pass
+
+    def save(self):
+        # Write to a temporary file first so that an interrupted save can't corrupt the manifest
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_text(json.dumps({"version": MANIFEST_VERSION, "sources": self.sources}))
+        os.replace(temp_path, self.path)
+
+
+def load_layout(path):
+    # Builds the LayoutPlan (or PhysicalLayout when monitors are given) described by a json layout file
+    parameters = json.loads(Path(path).read_text())
+    if not isinstance(parameters, dict) or ("resolutions" in parameters) == ("monitors" in parameters):
+        raise ValueError("The layout file should be a json object with either resolutions or monitors")
+    unknown = set(parameters) - {"resolutions", "gaps", "monitors", "resample", *MODES}
+    if unknown:
+        raise ValueError(f"Unknown layout options: {', '.join(sorted(unknown))}")
+    if "monitors" in parameters and "gaps" in parameters:
+        raise ValueError("Layouts with monitors don't take gaps, the monitor positions already include them")
+
+    if "resample" in parameters:
+        try:
+            parameters["resample"] = Image.Resampling[str(parameters["resample"]).upper()]
+        except KeyError:
+            raise ValueError(f"Unknown resample filter {parameters['resample']}")
+    if "monitors" in parameters:
+        monitors = []
+        for monitor in parameters.pop("monitors"):
+            try:
+                monitors.append(Monitor(**{k: tuple(v) if isinstance(v, list) else v for k, v in monitor.items()}))
+            except TypeError as e:
+                raise ValueError(f"Invalid monitor {monitor}: {e}")
+        return PhysicalLayout(monitors, **parameters)
+    parameters["resolutions"] = [tuple(r) for r in parameters["resolutions"]]
+    return LayoutPlan(**parameters)
+
+
+def layout_hash(plan: LayoutPlan, encoder: EncoderSettings):
+    # Hash of everything that affects the outputs, fitted sources with a different one are fitted again
+    parameters = {"plan": plan.parameters(), "encoder": asdict(encoder)}
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_extensions():
+    # Extensions of the formats Pillow can open
+    return {extension for extension, format in Image.registered_extensions().items() if format in Image.OPEN}
+
+
+def scan_directory(directory, extensions, exclude=None):
+    # Images directly in the directory (name -> stat result) and its subdirectories
+    files = {}
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if exclude is None or Path(entry.path) != exclude:
+                        subdirectories.append(Path(entry.path))
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                    files[entry.name] = entry.stat()
+    except FileNotFoundError:
+        pass
+    return files, subdirectories
+
+
+def walk(directory, extensions, exclude=None):
+    # Yields (directory, images in it, its subdirectories) for the directory and everything below it
+    stack = [Path(directory)]
+    while stack:
+        current = stack.pop()
+        files, subdirectories = scan_directory(current, extensions, exclude)
+        yield current, files, subdirectories
+        stack.extend(subdirectories)
+
+
+def sync(source_dir, output_dir, plan: LayoutPlan, encoder: EncoderSettings, manifest: Manifest, directories=None, workers=None, prune=False, settle=0):
+    """
+    Fits every new or changed image of source_dir to the plan and saves it under output_dir
+    with the same relative path. Only the given directories (not their subdirectories) are looked at
+    when directories is set, otherwise the whole tree is.
+    Files modified less than settle seconds ago are left for a later run.
+    """
+    source_dir = Path(source_dir)
+    output_dir = Path(output_dir)
+    extensions = image_extensions()
+    exclude = output_dir.resolve() if output_dir.resolve().is_relative_to(source_dir.resolve()) else None
+    current_layout = layout_hash(plan, encoder)
+    suffix = "." + (encoder.format or "png").lower()
+    result = SyncResult()
+
+    if directories is None:
+        scanned = walk(source_dir, extensions, exclude)
+    else:
+        scanned = ((directory, *scan_directory(directory, extensions, exclude)) for directory in directories)
+
+    settled = time.time_ns() - int(settle * 1e9)
+    seen = set()
+    scopes = set()
+    pending = []
+    for directory, files, _ in scanned:
+        scopes.add(directory.relative_to(source_dir).as_posix())
+        for name, stat in files.items():
+            source = (directory / name).relative_to(source_dir).as_posix()
+            seen.add(source)
+            if settle and stat.st_mtime_ns > settled:
+                # Still being written, the old entry is kept until the file is complete
+                if directory not in result.deferred:
+                    result.deferred.append(directory)
+                continue
+
+            entry = manifest.sources.get(source)
+            # The source extension stays in the name, a.jpg and a.png next to each other get outputs of their own
+            output = source + suffix
+            up_to_date = entry is not None and entry["layout"] == current_layout and entry["output"] == output and (output_dir / output).exists()
+
+            # Fast path, the file wasn't touched since it was fitted
+            if up_to_date and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                result.skipped += 1
+                continue
+
+            try:
+                digest = file_digest(directory / name)
+            except OSError as e:
+                result.failed += 1
+                print(f"Failed to read {source}: {e}", file=sys.stderr)
+                continue
+            if up_to_date and entry["digest"] == digest:
+                # Touched but not changed, remember the new modification time so it isn't hashed again
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                result.skipped += 1
+                continue
+            pending.append((source, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest, "layout": current_layout, "output": output}))
+
+    # Sources that are gone from the scanned directories
+    for source in list(manifest.sources):
+        parent = Path(source).parent.as_posix()
+        if source not in seen and (directories is None or parent in scopes):
+            entry = manifest.sources.pop(source)
+            if prune:
+                remove_output(output_dir, manifest, entry["output"])
+            result.removed += 1
+
+    if not pending:
+        manifest.save()
+        return result
+
+    # The process pool is only set up when there is something to fit, so that no-op runs start fast
+    from .image_resizer.batch import batch_resize
+
+    for _, entry in pending:
+        (output_dir / entry["output"]).parent.mkdir(parents=True, exist_ok=True)
+    inputs = [str(source_dir / source) for source, _ in pending]
+    outputs = [str(output_dir / entry["output"]) for _, entry in pending]
+    for batch_result in batch_resize(inputs, output_paths=outputs, plan=plan, encoder=encoder, workers=workers):
+        source, entry = pending[batch_result.index]
+        if batch_result.ok:
+            previous = manifest.sources.get(source)
+            manifest.sources[source] = entry
+            if previous is not None and previous["output"] != entry["output"]:
+                remove_output(output_dir, manifest, previous["output"])
+            result.processed += 1
+            if result.processed % SAVE_EVERY == 0:
+                manifest.save()
+        else:
+            # Forget the source so that it's tried again on the next run
+            manifest.sources.pop(source, None)
+            result.failed += 1
+            print(f"Failed to fit {source}: {batch_result.error}", file=sys.stderr)
+
+    manifest.save()
+    return result
+
+
+def remove_output(output_dir, manifest: Manifest, output):
+    # Deletes an output that was replaced or whose source is gone, unless another source still uses it
+    # (manifests of older versions named a.jpg and a.png both a.png)
+    if not any([entry["output"] == output for entry in manifest.sources.values()]):
+        (output_dir / output).unlink(missing_ok=True)
+
+
+def output_format(value):
+    # Pillow format of a --format value, which can also be an extension (jpg, tif)
+    extension = "." + value.lower().lstrip(".")
+    format = Image.registered_extensions().get(extension, value.upper())
+    if format not in Image.SAVE:
+        raise argparse.ArgumentTypeError(f"Pillow can't write {value} images")
+    return format
+
+
+def directory_mtimes(source_dir, exclude=None):
+    # Modification time of every directory of the tree, creating, renaming or deleting a file changes it
+    return {directory: os.stat(directory).st_mtime_ns for directory, _, _ in walk(source_dir, set(), exclude)}
+
+
+def changed_directories(mtimes, exclude=None):
+    """
+    Compares the directories with their recorded modification times and returns the ones that changed,
+    the ones that were added below them and the ones that are gone. Updates mtimes in place.
+    Only the known directories are stat-ed, the files in them are only listed once a directory changed.
+    """
+    changed = []
+    removed = []
+    for directory, mtime in list(mtimes.items()):
+        try:
+            current = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            del mtimes[directory]
+            removed.append(directory)
+            continue
+        if current == mtime:
+            continue
+        mtimes[directory] = current
+        changed.append(directory)
+        # Pick up new subdirectories with everything in them
+        for subdirectory in scan_directory(directory, set(), exclude)[1]:
+            if subdirectory not in mtimes:
+                added = directory_mtimes(subdirectory, exclude)
+                mtimes.update(added)
+                changed.extend(added)
+    return changed, removed
+
+
+def watch(source_dir, output_dir, plan: LayoutPlan, encoder: EncoderSettings, manifest: Manifest, interval=2.0, workers=None, prune=False):
+    # Polls the directories of the tree and syncs the ones that changed. Runs until interrupted
+    source_dir = Path(source_dir)
+    output_dir = Path(output_dir)
+    exclude = output_dir.resolve() if output_dir.resolve().is_relative_to(source_dir.resolve()) else None
+    mtimes = directory_mtimes(source_dir, exclude)
+    while True:
+        time.sleep(interval)
+        changed, removed = changed_directories(mtimes, exclude)
+        if changed or removed:
+            # Removed directories are scanned too, they come back empty so their sources are dropped
+            result = sync(source_dir, output_dir, plan, encoder, manifest, directories=changed + removed, workers=workers, prune=prune, settle=interval)
+            report(result)
+            # Files that were still being written are picked up on one of the next polls
+            for directory in result.deferred:
+                mtimes[directory] = None
+
+
+def report(result: SyncResult):
+    print(f"fitted {result.processed}, skipped {result.skipped}, failed {result.failed}, removed {result.removed}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="wallfit", description="Fit a folder of wallpapers to a monitor layout")
+    parser.add_argument("source", type=Path, help="folder with the wallpapers")
+    parser.add_argument("output", type=Path, help="folder for the fitted wallpapers")
+    parser.add_argument("--layout", type=Path, required=True, help="json file with the LayoutPlan or PhysicalLayout arguments")
+    parser.add_argument("--format", type=output_format, default="PNG", help="output format or extension (default png)")
+    parser.add_argument("--quality", type=int, help="JPEG/WebP quality")
+    parser.add_argument("--progressive", action="store_true", help="write progressive JPEGs")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--prune", action="store_true", help="delete the outputs of sources that were removed")
+    parser.add_argument("--watch", action="store_true", help="keep running and fit new files as they show up")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between checks in watch mode")
+    args = parser.parse_args(argv)
+
+    if not args.source.is_dir():
+        parser.error(f"{args.source} is not a folder")
+    try:
+        plan = load_layout(args.layout)
+    except (OSError, ValueError) as e:
+        parser.error(f"Invalid layout file: {e}")
+    encoder = EncoderSettings(format=args.format, quality=args.quality, progressive=args.progressive)
+
+    manifest = Manifest(args.output / MANIFEST_NAME)
+    result = sync(args.source, args.output, plan, encoder, manifest, workers=args.workers, prune=args.prune)
+    report(result)
+    if args.watch:
+        try:
+            watch(args.source, args.output, plan, encoder, manifest, args.interval, args.workers, args.prune)
+        except KeyboardInterrupt:
+            pass
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,53 @@
-from .resizer import multi_monitor_resize
\ No newline at end of file
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Public names and the modules they live in. Modules are only imported on first use, so that importing
+# the package doesn't pull in Pillow, requests or the process pool machinery before they are needed
+_EXPORTS = {
+    "multi_monitor_resize": ".resizer",
+    "LayoutPlan": ".plan",
+    "Monitor": ".layout",
+    "PhysicalLayout": ".layout",
+    "render_layouts": ".render",
+    "tiled_fit": ".tiled",
+    "fit_monitors": ".monitors",
+    "EncoderSettings": ".encode",
+    "batch_resize": ".batch",
+    "BatchResult": ".batch",
+    "FitCache": ".cache",
+    "ImageFetcher": ".fetch",
+    "FitServer": ".service",
+    "FitClient": ".service",
+    "instrument": ".instrument",
+    "StageEvent": ".instrument",
+    "StageHistogram": ".instrument",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .resizer import multi_monitor_resize
+    from .plan import LayoutPlan
+    from .layout import Monitor, PhysicalLayout
+    from .render import render_layouts
+    from .tiled import tiled_fit
+    from .monitors import fit_monitors
+    from .encode import EncoderSettings
+    from .batch import batch_resize, BatchResult
+    from .cache import FitCache
+    from .fetch import ImageFetcher
+    from .service import FitServer, FitClient
+    from .instrument import instrument, StageEvent, StageHistogram
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    # Cache it in the module so that __getattr__ only runs once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
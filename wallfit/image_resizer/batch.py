@@ -0,0 +1,121 @@
+import io
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from itertools import islice
+from pathlib import Path
+from PIL import Image
+from .encode import EncoderSettings, save_image
+from .instrument import StageEvent, current_callback, instrument
+from .plan import LayoutPlan
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of a single item of a batch_resize call.
+    output is the output path when one was given, otherwise the encoded image bytes.
+    error holds the exception raised while processing the item (output is None in that case).
+    stages holds the StageEvents of the item when batch_resize was called inside an instrument() block.
+    """
+    index: int
+    source: str | bytes | Path
+    output: str | Path | bytes | None = None
+    error: BaseException | None = None
+    stages: list[StageEvent] | None = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def batch_resize(inputs, resolutions=None, output_paths=None, workers=None, chunk_size=1, format=None, plan: LayoutPlan | None = None, encoder: EncoderSettings | None = None, **kwargs):
+    """
+    Runs multi_monitor_resize over many inputs on a process pool and yields a BatchResult per input as soon as it's done.
+    Results come back in completion order, use BatchResult.index to match them with the inputs.
+
+    Only file paths and urls are accepted as inputs so that workers open the images themselves
+    and nothing but paths and encoded bytes is sent between processes.
+    Any keyword arguments (gaps, black_bars, prefer_* flags, ...) are the same as for multi_monitor_resize,
+    alternatively a LayoutPlan can be passed instead of resolutions and the keyword arguments.
+    encoder (EncoderSettings) sets the options used for encoding the outputs.
+    Outputs returned as bytes are encoded in encoder.format when it's set, otherwise in format (PNG if neither is given).
+    """
+    if plan is None:
+        plan = LayoutPlan(resolutions, **kwargs)
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be at least 1")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers should be at least 1")
+
+    # Workers can't see the callback of the caller, they send the stage events back with the results instead
+    callback = current_callback()
+
+    if output_paths is None:
+        items = ((i, source, None) for i, source in enumerate(inputs))
+    else:
+        items = ((i, source, output_path) for i, (source, output_path) in enumerate(zip(inputs, output_paths, strict=True)))
+
+    # Keep a few chunks queued per worker so that all cores stay busy without materializing the whole batch at once
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(items, chunk_size))
+                if not chunk:
+                    break
+                for _, source, _ in chunk:
+                    if isinstance(source, Image.Image):
+                        raise ValueError("batch_resize expects file paths or urls, not Image objects")
+                future = executor.submit(_resize_chunk, chunk, plan, format, encoder, callback is not None)
+                pending[future] = chunk
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # The whole chunk failed (e.g. a worker died), report it on every item
+                    results = [BatchResult(index=i, source=source, error=e) for i, source, _ in chunk]
+                for result in results:
+                    if callback is not None and result.stages is not None:
+                        callback(result.stages)
+                    yield result
+
+
+def _resize_chunk(chunk, plan, format, encoder, collect_stages):
+    results = []
+    for index, source, output_path in chunk:
+        stages = [] if collect_stages else None
+        try:
+            with instrument(stages.extend) if collect_stages else nullcontext():
+                image = plan.fit(source, output_path=output_path, encoder=encoder)
+                if output_path:
+                    output = output_path
+                else:
+                    buffer = io.BytesIO()
+                    settings = encoder or EncoderSettings()
+                    save_image(image, buffer, replace(settings, format=settings.format or format or "PNG"))
+                    output = buffer.getvalue()
+            results.append(BatchResult(index=index, source=source, output=output, stages=stages))
+        except Exception as e:
+            results.append(BatchResult(index=index, source=source, error=_picklable(e), stages=stages))
+    return results
+
+
+def _picklable(error):
+    # Errors are sent back to the parent process, make sure that a failing item can't break the whole chunk
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image
+from .encode import EncoderSettings, save_image
+from .plan import LayoutPlan
+
+# Cache keys are sha256 hex digests, anything else in the directory isn't an entry
+KEY_PATTERN = re.compile("[0-9a-f]{64}")
+
+
+class FitCache:
+    """
+    On-disk cache of fitted wallpapers, keyed by the source bytes and every parameter that affects the output.
+    Once the cached files take up more than max_bytes the least recently used ones are removed.
+
+    Usage:
+        cache = FitCache("cache_dir", max_bytes=512 * 1024 * 1024)
+        data = cache.resize("input.jpg", resolutions=[(1920, 1080)], format="JPEG")
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = 1024 * 1024 * 1024):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes should be positive")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> file size, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+        # Pick up entries left by earlier runs, the access time is kept in the file modification time
+        existing = []
+        for path in self.directory.glob("*/*"):
+            if not KEY_PATTERN.fullmatch(path.name) or path.parent.name != path.name[:2] or not path.is_file():
+                # Temporary files of interrupted writes and files that don't belong to the cache
+                continue
+            stat = path.stat()
+            existing.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    def resize(self, fp: str | bytes | Path | Image.Image, resolutions=None, format="PNG", plan: LayoutPlan | None = None, **kwargs):
+        """
+        Same as multi_monitor_resize but returns the encoded output (a read only memory map of the cached file,
+        or the bytes if the output is larger than max_bytes and wasn't kept).
+        Instead of resolutions and the other layout arguments a LayoutPlan can be passed.
+        On a hit Pillow isn't used at all.
+        """
+        if plan is None:
+            plan = LayoutPlan(resolutions, **kwargs)
+
+        if isinstance(fp, Image.Image):
+            source = None
+            digest = image_digest(fp)
+        else:
+            source = source_bytes(fp)
+            digest = hashlib.sha256(source).hexdigest()
+
+        key = self.key(digest, plan, format=format)
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        image = plan.fit(fp if source is None else io.BytesIO(source))
+        buffer = io.BytesIO()
+        save_image(image, buffer, EncoderSettings(format=format))
+        data = buffer.getvalue()
+        self.put(key, data)
+        cached = self.get(key, count=False)
+        # Outputs larger than the whole cache are evicted right away
+        return data if cached is None else cached
+
+    def key(self, source_digest, plan: LayoutPlan, format="PNG"):
+        parameters = plan.parameters()
+        parameters["source"] = source_digest
+        parameters["format"] = format.upper()
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key, count=True):
+        # Returns a read only memory map of the cached output or None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # Missing or empty (removed by another process or never written)
+            with self._lock:
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)
+                if count:
+                    self.misses += 1
+            return None
+
+        with self._lock:
+            if key not in self._entries:
+                # Written by another process sharing the directory
+                self._entries[key] = len(data)
+                self._size += len(data)
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+        return data
+
+    def put(self, key, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Write to a temporary file first so that readers never see a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _evict(self):
+        # Expects the lock to be held (or the cache not to be shared yet)
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # The file is still memory mapped (Windows), it will be picked up again on the next start
+                pass
+            self.evictions += 1
+
+    def _path(self, key):
+        return self.directory / key[:2] / key
+
+
+def source_bytes(fp):
+    # Reads the encoded source the same way multi_monitor_resize would open it
+    if isinstance(fp, str) and fp.startswith("http"):
+        from .fetch import default_fetcher
+
+        return default_fetcher().fetch_bytes(fp)
+    if hasattr(fp, "read"):
+        return fp.read()
+    with open(fp, "rb") as f:
+        return f.read()
+
+
+def image_digest(image):
+    digest = hashlib.sha256(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
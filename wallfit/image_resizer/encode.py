@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from pathlib import Path
+from PIL import Image
+
+# Modes each format can store, other modes are converted to RGB before saving
+SAVE_MODES = {
+    "JPEG": ["1", "L", "RGB", "CMYK"],
+    "WEBP": ["RGB", "RGBA"],
+}
+
+
+@dataclass
+class EncoderSettings:
+    """
+    Encoder options for saving outputs, trading encode time against file size.
+    Options that don't apply to the format being saved are ignored.
+
+    format: output format, by default worked out from the file extension
+    quality: JPEG (1-95) and WebP (0-100) quality
+    progressive: write progressive JPEGs
+    subsampling: JPEG chroma subsampling, "4:4:4", "4:2:2" or "4:2:0"
+    optimize: extra pass to optimize JPEG huffman tables or PNG encoding (slower)
+    compress_level: PNG zlib level, 0 (fastest, biggest) to 9 (slowest, smallest)
+    method: WebP encoder effort, 0 (fastest) to 6 (slowest, smallest)
+    lossless: lossless WebP
+    """
+    format: str | None = None
+    quality: int | None = None
+    progressive: bool = False
+    subsampling: str | None = None
+    optimize: bool = False
+    compress_level: int | None = None
+    method: int | None = None
+    lossless: bool = False
+
+    def options(self, format):
+        # Keyword arguments for Image.save for the given format
+        format = format.upper()
+        options = {}
+        if format == "JPEG":
+            if self.quality is not None:
+                options["quality"] = self.quality
+            if self.subsampling is not None:
+                options["subsampling"] = self.subsampling
+            options["progressive"] = self.progressive
+            options["optimize"] = self.optimize
+        elif format == "PNG":
+            if self.compress_level is not None:
+                options["compress_level"] = self.compress_level
+            options["optimize"] = self.optimize
+        elif format == "WEBP":
+            if self.quality is not None:
+                options["quality"] = self.quality
+            if self.method is not None:
+                options["method"] = self.method
+            options["lossless"] = self.lossless
+        return options
+
+
+def save_image(image, fp, encoder: EncoderSettings | None = None):
+    # Saves the image to a path or file object with the encoder settings (Pillow defaults without them)
+    if encoder is None:
+        image.save(fp)
+        return
+
+    format = encoder.format or Image.registered_extensions().get(Path(fp).suffix.lower())
+    if format is None:
+        raise ValueError(f"Can't work out the output format of {fp}, set EncoderSettings.format")
+    format = format.upper()
+    if format in SAVE_MODES and image.mode not in SAVE_MODES[format]:
+        image = image.convert("RGB")
+    image.save(fp, format=format, **encoder.options(format))
@@ -0,0 +1,197 @@
+import asyncio
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageFile
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+CHUNK_SIZE = 64 * 1024
+# Encoded bodies of revalidated responses kept in memory, decoded images are never kept
+DEFAULT_MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+
+class ImageFetcher:
+    """
+    Downloads images over a pool of keep-alive connections and decodes them while they are being downloaded.
+    At most max_connections downloads run at the same time. The encoded bodies of responses with an ETag or
+    Last-Modified header are remembered (up to max_cached responses and max_cached_bytes) and revalidated with
+    a conditional request on the next fetch.
+
+    Usage:
+        async with ImageFetcher(max_connections=16) as fetcher:
+            images = await fetcher.fetch_many(urls)
+    """
+
+    def __init__(self, max_connections=8, timeout=DEFAULT_TIMEOUT, max_cached=32, session: requests.Session | None = None, max_cached_bytes=DEFAULT_MAX_CACHED_BYTES):
+        if max_connections < 1:
+            raise ValueError("max_connections should be at least 1")
+        self.timeout = timeout
+        self.max_cached = max_cached
+        self.max_cached_bytes = max_cached_bytes
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Downloads are blocking, the executor runs them off the event loop and limits the concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="wallfit-fetch")
+        self._lock = threading.Lock()
+        # url -> (etag, last modified, encoded body), least recently used first
+        self._validated = OrderedDict()
+        self._cached_bytes = 0
+
+    def fetch_image(self, url: str) -> Image.Image:
+        # Blocking version of fetch
+        return self._fetch(url, None)
+
+    def fetch_source(self, url: str, size=None):
+        """
+        Like fetch_image, for callers that decode at a reduced resolution (see LayoutPlan.load).
+        JPEGs at least twice the size (width, height) the caller needs are buffered and returned as a file object
+        that Image.open can draft, decoding them halved or less beats decoding them at full size while they download.
+        Everything else is decoded while it downloads and returned as an Image.
+        """
+        return self._fetch(url, size)
+
+    def _fetch(self, url, size):
+        cached = self._cached(url)
+        with self.session.get(url, headers=conditional_headers(cached), timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and cached is not None:
+                self._touch(url)
+                if size is not None:
+                    return io.BytesIO(cached[2])
+                image = Image.open(io.BytesIO(cached[2]))
+                image.load()
+                return image
+            response.raise_for_status()
+
+            # Decode the chunks as they arrive instead of buffering the whole body first.
+            # The body is only kept if the response can be revalidated, or until the header shows
+            # whether the image is decoded while it downloads or opened as a file
+            keep = self._cacheable(response)
+            undecided = size is not None
+            chunks = []
+            parser = ImageFile.Parser()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if keep or undecided or parser is None:
+                    chunks.append(chunk)
+                if parser is None:
+                    continue
+                parser.feed(chunk)
+                if undecided and parser.image is not None:
+                    undecided = False
+                    if draft_reduces(parser.image, size):
+                        # Stop decoding and buffer the rest
+                        parser = None
+                    elif not keep:
+                        chunks = []
+            data = b"".join(chunks)
+            if keep:
+                self._remember(url, response, data)
+        return io.BytesIO(data) if parser is None else parser.close()
+
+    def fetch_bytes(self, url: str) -> bytes:
+        # Encoded body of the response, revalidated like fetch_image
+        cached = self._cached(url)
+        response = self.session.get(url, headers=conditional_headers(cached), timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            self._touch(url)
+            return cached[2]
+        response.raise_for_status()
+        if self._cacheable(response):
+            self._remember(url, response, response.content)
+        return response.content
+
+    def _cached(self, url):
+        with self._lock:
+            return self._validated.get(url)
+
+    def _touch(self, url):
+        with self._lock:
+            if url in self._validated:
+                self._validated.move_to_end(url)
+
+    def _cacheable(self, response):
+        validated = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        return bool(validated) and self.max_cached > 0 and self.max_cached_bytes > 0
+
+    def _remember(self, url, response, data):
+        if len(data) > self.max_cached_bytes:
+            return
+        with self._lock:
+            if url in self._validated:
+                self._cached_bytes -= len(self._validated.pop(url)[2])
+            self._validated[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"), data)
+            self._cached_bytes += len(data)
+            while len(self._validated) > self.max_cached or self._cached_bytes > self.max_cached_bytes:
+                _, (_, _, evicted) = self._validated.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    async def fetch(self, url: str) -> Image.Image:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.fetch_image, url)
+
+    async def fetch_many(self, urls, return_exceptions=False):
+        # Returns the images in the same order as the urls
+        return await asyncio.gather(*[self.fetch(url) for url in urls], return_exceptions=return_exceptions)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def draft_reduces(image, size):
+    # Whether the decoder can decode the image at half its resolution or less and still cover the size
+    return image.format == "JPEG" and image.size[0] >= 2 * size[0] and image.size[1] >= 2 * size[1]
+
+
+def conditional_headers(cached):
+    # Request headers that let the server answer 304 if the cached response is still valid
+    headers = {}
+    if cached is not None:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def default_fetcher() -> ImageFetcher:
+    # Shared by multi_monitor_resize so that repeated calls reuse connections
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = ImageFetcher()
+        return _default_fetcher
+
+
+def _reset_default_fetcher():
+    # Connections and threads can't be shared with forked worker processes
+    global _default_fetcher, _default_fetcher_lock
+    _default_fetcher = None
+    _default_fetcher_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_default_fetcher)
@@ -0,0 +1,185 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+# Callback of the innermost instrument() block
+_callback = ContextVar("wallfit_callback", default=None)
+# Events of the fit call that is being traced
+_events = ContextVar("wallfit_events", default=None)
+
+# Upper bounds (in seconds) of the StageHistogram buckets
+DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+@dataclass
+class StageEvent:
+    """
+    Timing of one stage of a fit call (fetch, decode, crop, resize, stitch or save).
+    pixels is the size of the image the stage produced and bytes the memory taken up by it.
+    Stages that run once per monitor or strip report one event per run.
+    """
+    stage: str
+    seconds: float
+    pixels: int = 0
+    bytes: int = 0
+
+
+@contextmanager
+def instrument(callback):
+    """
+    Calls callback with the list of StageEvents of every fit (multi_monitor_resize, plan.fit, plan.apply, tiled_fit)
+    made inside the block, including the ones batch_resize runs in worker processes.
+
+    Usage:
+        with instrument(lambda events: print(events)):
+            multi_monitor_resize("input.jpg", resolutions=[(1920, 1080)])
+    """
+    token = _callback.set(callback)
+    try:
+        yield
+    finally:
+        _callback.reset(token)
+
+
+def current_callback():
+    return _callback.get()
+
+
+class _Trace:
+    # Collects the events of a single fit call and hands them to the callback at the end
+    def __init__(self, callback):
+        self.callback = callback
+        self.events = []
+
+    def __enter__(self):
+        self.token = _events.set(self.events)
+        return self
+
+    def __exit__(self, *exc_info):
+        _events.reset(self.token)
+        self.callback(self.events)
+
+
+class _Stage:
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+        self.pixels = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.events.append(StageEvent(self.name, time.perf_counter() - self.start, self.pixels, self.bytes))
+
+    def record(self, image):
+        self.pixels = image.size[0] * image.size[1]
+        self.bytes = self.pixels * (1 if image.mode in ["1", "L", "P"] else 4)
+
+
+class _Disabled:
+    # Shared by every stage and call while nothing is instrumented, so that tracing costs next to nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def record(self, image):
+        pass
+
+
+_DISABLED = _Disabled()
+
+
+def traced_call():
+    # Wraps a whole fit call. Calls nested in another traced call report together with it
+    callback = _callback.get()
+    if callback is None or _events.get() is not None:
+        return _DISABLED
+    return _Trace(callback)
+
+
+def stage(name):
+    # Times the stage if the current fit call is traced
+    events = _events.get()
+    if events is None:
+        return _DISABLED
+    return _Stage(name, events)
+
+
+class StageHistogram:
+    """
+    Callback for instrument() that aggregates the stage timings of many calls into histograms.
+
+    Usage:
+        histogram = StageHistogram()
+        with instrument(histogram):
+            for result in batch_resize(paths, resolutions=[(1920, 1080)]):
+                pass
+        print(histogram.summary())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.calls = 0
+        self._lock = threading.Lock()
+        # stage -> counts per bucket (the last one counts everything above the last bound)
+        self._counts = {}
+        self._totals = {}
+
+    def __call__(self, events):
+        with self._lock:
+            self.calls += 1
+            # Stages that run per monitor or strip are added up so that every call counts once per stage
+            per_call = {}
+            for event in events:
+                seconds, pixels, allocated = per_call.get(event.stage, (0, 0, 0))
+                per_call[event.stage] = (seconds + event.seconds, pixels + event.pixels, allocated + event.bytes)
+
+            for name, (seconds, pixels, allocated) in per_call.items():
+                counts = self._counts.setdefault(name, [0] * (len(self.buckets) + 1))
+                counts[bisect.bisect_left(self.buckets, seconds)] += 1
+                totals = self._totals.setdefault(name, [0, 0.0, 0, 0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] += pixels
+                totals[3] += allocated
+
+    def percentile(self, stage, q):
+        # Upper bound of the bucket that holds the q-th (0-1) quantile of the stage durations
+        with self._lock:
+            counts = self._counts.get(stage)
+            if not counts:
+                return None
+            target = q * sum(counts)
+            seen = 0
+            for i, count in enumerate(counts):
+                seen += count
+                if seen >= target and count:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+            return float("inf")
+
+    def summary(self):
+        # stage -> count, total and mean seconds, approximate p50/p95, pixels and bytes
+        summary = {}
+        for name in list(self._counts):
+            with self._lock:
+                count, seconds, pixels, allocated = self._totals[name]
+                buckets = list(self._counts[name])
+            summary[name] = {
+                "count": count,
+                "total_seconds": seconds,
+                "mean_seconds": seconds / count,
+                "p50_seconds": self.percentile(name, 0.5),
+                "p95_seconds": self.percentile(name, 0.95),
+                "pixels": pixels,
+                "bytes": allocated,
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["inf"], buckets)),
+            }
+        return summary
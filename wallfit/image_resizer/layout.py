@@ -0,0 +1,138 @@
+import math
+from dataclasses import dataclass
+from PIL import Image
+from .plan import MODES, LayoutPlan
+
+MM_PER_INCH = 25.4
+
+
+@dataclass(frozen=True)
+class Monitor:
+    """
+    A monitor placed by its physical position, so that monitors of different sizes and pixel densities
+    can be laid out anywhere (side by side, stacked, in a grid, shifted up or down).
+
+    resolution: (width, height) in pixels
+    position: (x, y) of the top left corner in millimetres, y grows downwards
+    size: (width, height) of the visible area in millimetres, alternatively set dpi
+    dpi: pixel density, the physical size is worked out from it and the resolution
+    offset: (x, y) of the monitor in the desktop in pixels, only used to place it in the stitched image
+    """
+    resolution: tuple[int, int]
+    position: tuple[float, float] = (0, 0)
+    size: tuple[float, float] | None = None
+    dpi: float | None = None
+    offset: tuple[int, int] | None = None
+
+    def physical_size(self):
+        if self.size is not None:
+            return float(self.size[0]), float(self.size[1])
+        return self.resolution[0] / self.dpi * MM_PER_INCH, self.resolution[1] / self.dpi * MM_PER_INCH
+
+
+class PhysicalLayout(LayoutPlan):
+    """
+    LayoutPlan for monitors described in physical coordinates. The image is fitted to the bounding box
+    of all monitors and every monitor gets the part of the image that is physically in front of it,
+    resampled straight from the source at the monitor's own resolution. A small high-DPI monitor next to
+    a large low-DPI one shows the image at the same physical scale and neither is resized from the other.
+
+    Works everywhere a LayoutPlan does: fit/apply return the monitors stitched into one desktop image
+    (monitors are placed at their offsets, by default at their physical position at the highest pixel density),
+    fit_monitors returns one image per monitor.
+
+    Usage:
+        layout = PhysicalLayout([
+            Monitor((2560, 1440), position=(0, 0), size=(597, 336)),
+            Monitor((1920, 1080), position=(610, 60), dpi=92),
+        ])
+        fit_monitors("input.jpg", layout, ["left.png", "right.png"])
+    """
+
+    def __init__(self, monitors, black_bars=False, prefer_center=False, prefer_left=False, prefer_right=False, prefer_top=False, prefer_bottom=False, resample=None, prefer_salient=False):
+        if not monitors:
+            raise ValueError("There should be at least one monitor")
+
+        # Only one of the prefer flags should be set
+        flags = [black_bars, prefer_center, prefer_left, prefer_right, prefer_top, prefer_bottom, prefer_salient]
+        flags_set = sum([1 if p else 0 for p in flags])
+        if flags_set > 1:
+            raise ValueError("Only one of the prefer flags should be set")
+        self.mode = MODES[[bool(p) for p in flags].index(True)] if flags_set == 1 else "prefer_center"
+        self.resample = resample
+
+        # (x, y, width, height) of every monitor in millimetres
+        rects = []
+        for monitor in monitors:
+            if monitor.size is None and not monitor.dpi:
+                raise ValueError("Monitors need either a physical size or a dpi")
+            width, height = monitor.physical_size()
+            if width <= 0 or height <= 0 or monitor.resolution[0] <= 0 or monitor.resolution[1] <= 0:
+                raise ValueError("Monitor sizes and resolutions should be positive")
+            rects.append((float(monitor.position[0]), float(monitor.position[1]), width, height))
+        for i, a in enumerate(rects):
+            for b in rects[i + 1:]:
+                if a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]:
+                    raise ValueError("Monitors can't overlap")
+
+        self.monitor_list = tuple(monitors)
+        self.resolutions = tuple([(int(m.resolution[0]), int(m.resolution[1])) for m in monitors])
+        self.gaps = ()
+
+        # Bounding box of all monitors, this is what the image is fitted to
+        left = min([r[0] for r in rects])
+        top = min([r[1] for r in rects])
+        self.physical_size = (max([r[0] + r[2] for r in rects]) - left, max([r[1] + r[3] for r in rects]) - top)
+        self.target_aspect_ratio = self.physical_size[0] / self.physical_size[1]
+        self.rects = tuple([(r[0] - left, r[1] - top, r[2], r[3]) for r in rects])
+
+        # The densest monitor decides how much of the source resolution is needed
+        density_x = max([res[0] / r[2] for res, r in zip(self.resolutions, self.rects)])
+        density_y = max([res[1] / r[3] for res, r in zip(self.resolutions, self.rects)])
+        self.box_size = (math.ceil(self.physical_size[0] * density_x), math.ceil(self.physical_size[1] * density_y))
+
+        offsets = []
+        for monitor, rect in zip(monitors, self.rects):
+            if monitor.offset is not None:
+                offsets.append((int(monitor.offset[0]), int(monitor.offset[1])))
+            else:
+                # Monitors are never denser than the highest density, so they can't overlap at it
+                offsets.append((round(rect[0] * density_x), round(rect[1] * density_y)))
+        # Desktop coordinates can be negative (monitors left of or above the primary one)
+        min_x = min([o[0] for o in offsets])
+        min_y = min([o[1] for o in offsets])
+        self.offsets = tuple([(o[0] - min_x, o[1] - min_y) for o in offsets])
+        self.size = (
+            max([o[0] + r[0] for o, r in zip(self.offsets, self.resolutions)]),
+            max([o[1] + r[1] for o, r in zip(self.offsets, self.resolutions)]),
+        )
+
+        # The LayoutPlan attributes, with the box the image is resized to (at the highest density) in place of
+        # the row of monitors with gaps. monitors holds (start in the box, start in the output, width) like it does there
+        self.width_with_gaps, self.target_height = self.box_size
+        self.monitors_width = self.size[0]
+        self.monitors = tuple([(round(rect[0] * density_x), offset[0], res[0]) for rect, offset, res in zip(self.rects, self.offsets, self.resolutions)])
+
+    def parameters(self):
+        # Everything that affects the output, in a json friendly form
+        return {
+            "monitors": [{"resolution": list(res), "rect": list(rect), "offset": list(offset)} for res, rect, offset in zip(self.resolutions, self.rects, self.offsets)],
+            "mode": self.mode,
+            "resample": int(Image.Resampling.BICUBIC if self.resample is None else self.resample),
+        }
+
+    def regions(self, box, per_monitor=False):
+        # Every monitor is resampled on its own (per_monitor is always on)
+        scale_x = (box[2] - box[0]) / self.physical_size[0]
+        scale_y = (box[3] - box[1]) / self.physical_size[1]
+        regions = []
+        for (x, y, width, height), offset, resolution in zip(self.rects, self.offsets, self.resolutions):
+            source_box = (box[0] + x * scale_x, box[1] + y * scale_y, box[0] + (x + width) * scale_x, box[1] + (y + height) * scale_y)
+            regions.append((source_box, offset, resolution))
+        return regions
+
+    def __hash__(self):
+        return hash((self.resolutions, self.rects, self.offsets, self.mode, self.parameters()["resample"]))
+
+    def __repr__(self):
+        return f"PhysicalLayout(monitors={list(self.monitor_list)}, mode={self.mode!r})"
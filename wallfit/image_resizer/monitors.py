@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from PIL import Image
+from .encode import EncoderSettings, save_image
+from .instrument import stage, traced_call
+from .plan import LayoutPlan, resample_box
+
+
+def fit_monitors(fp: str | bytes | Path | Image.Image, plan: LayoutPlan, output_paths=None, encoder: EncoderSettings | None = None, workers=None):
+    """
+    Fits the image to the layout and returns one image per monitor instead of a single stitched one.
+    Every monitor is resampled straight from the decoded source (nothing is cropped out of a stitched image)
+    and resized and encoded on its own thread, Pillow releases the GIL for both.
+    Outputs are saved to output_paths (one per monitor) with the encoder settings if given.
+
+    Usage:
+        plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[20])
+        fit_monitors("input.jpg", plan, ["left.jpg", "right.jpg"], EncoderSettings(quality=85, progressive=True))
+    """
+    if output_paths is not None and len(output_paths) != len(plan.resolutions):
+        raise ValueError("There should be as many output paths as resolutions")
+
+    with traced_call():
+        image, box = plan.load(fp)
+        # Load before handing the image to the threads so that they don't race to decode it
+        image.load()
+        regions = plan.regions(box, per_monitor=True)
+
+        with ThreadPoolExecutor(max_workers=workers or len(regions)) as executor:
+            futures = []
+            for i, (source_box, _, size) in enumerate(regions):
+                output_path = output_paths[i] if output_paths is not None else None
+                # Run in a copy of the context so that the stages are still reported
+                futures.append(executor.submit(copy_context().run, _fit_monitor, image, source_box, size, plan.resample, output_path, encoder))
+            return [future.result() for future in futures]
+
+
+def _fit_monitor(image, source_box, size, resample, output_path, encoder):
+    with stage("resize") as s:
+        output = resample_box(image, source_box, size, resample)
+        s.record(output)
+    if output_path:
+        with stage("save") as s:
+            save_image(output, output_path, encoder)
+            s.record(output)
+    return output
@@ -0,0 +1,323 @@
+import math
+from pathlib import Path
+from PIL import Image
+from .encode import EncoderSettings, save_image
+from .instrument import stage, traced_call
+from .saliency import edge_profiles, salient_box, source_key
+
+# Larger images are first shrunk with Image.reduce (by an integer factor) to at most this many times the target size
+# before the actual resampling. 3.0 gives results that can't be told apart from resampling the full image
+REDUCING_GAP = 3.0
+
+# Ways of matching the aspect ratio, named after the multi_monitor_resize flags
+MODES = ["black_bars", "prefer_center", "prefer_left", "prefer_right", "prefer_top", "prefer_bottom", "prefer_salient"]
+
+
+class LayoutPlan:
+    """
+    Everything multi_monitor_resize works out from the layout, computed once so that the same layout
+    can be applied to many images. Plans only hold a few numbers and tuples so they are cheap to pickle
+    and can be sent to worker processes or used as cache keys.
+
+    Usage:
+        plan = LayoutPlan([(1920, 1080), (1920, 1080)], gaps=[20], prefer_left=True)
+        for path in paths:
+            plan.fit(path, output_path=...)
+    """
+
+    def __init__(self, resolutions, gaps=None, black_bars=False, prefer_center=False, prefer_left=False, prefer_right=False, prefer_top=False, prefer_bottom=False, resample=None, prefer_salient=False):
+        if gaps is None:
+            gaps = []
+
+        # there should be less gaps than resolutions
+        if len(gaps) >= len(resolutions):
+            raise ValueError("There should be less gaps than resolutions")
+
+        # Only one of the prefer flags should be set
+        flags = [black_bars, prefer_center, prefer_left, prefer_right, prefer_top, prefer_bottom, prefer_salient]
+        flags_set = sum([1 if p else 0 for p in flags])
+        if flags_set > 1:
+            raise ValueError("Only one of the prefer flags should be set")
+        self.mode = MODES[[bool(p) for p in flags].index(True)] if flags_set == 1 else "prefer_center"
+
+        self.resolutions = tuple([(int(r[0]), int(r[1])) for r in resolutions])
+        self.gaps = tuple([int(g) for g in gaps])
+        self.resample = resample
+
+        self.monitors_width = sum([r[0] for r in self.resolutions])
+        self.width_with_gaps = self.monitors_width + sum(self.gaps)
+        self.target_height = min([r[1] for r in self.resolutions])
+        self.target_aspect_ratio = self.width_with_gaps / self.target_height
+        self.size = (self.monitors_width, self.target_height)
+        # Resolution the box is resized to (including the gaps), the decoder never needs more than this
+        self.box_size = (self.width_with_gaps, self.target_height)
+
+        # (start in the image with gaps, start in the output, width) of every monitor
+        monitors = []
+        current_x = 0
+        output_x = 0
+        for i, resolution in enumerate(self.resolutions):
+            gap_after = self.gaps[i] if i < len(self.gaps) else 0
+            monitors.append((current_x, output_x, resolution[0]))
+            current_x += resolution[0] + gap_after
+            output_x += resolution[0]
+        self.monitors = tuple(monitors)
+
+    def parameters(self):
+        # Everything that affects the output, in a json friendly form
+        return {
+            "resolutions": [list(r) for r in self.resolutions],
+            "gaps": list(self.gaps),
+            "mode": self.mode,
+            "resample": int(Image.Resampling.BICUBIC if self.resample is None else self.resample),
+        }
+
+    def box(self, size):
+        # Part of an image of the given size that is fitted to the monitors (centered for prefer_salient,
+        # which is only placed once the pixels are known, see prepare)
+        return mode_box(size, self.target_aspect_ratio, self.mode)
+
+    def regions(self, box, per_monitor=False):
+        # (source box, position in the output, size in the output) of every monitor for the given crop box.
+        # Without gaps the monitors are resized as a whole unless per_monitor is set
+        if not self.gaps and not per_monitor:
+            return [(box, (0, 0), self.size)]
+
+        scale_x = (box[2] - box[0]) / self.width_with_gaps
+        regions = []
+        for gapped_x, output_x, width in self.monitors:
+            source_box = (box[0] + gapped_x * scale_x, box[1], box[0] + (gapped_x + width) * scale_x, box[3])
+            regions.append((source_box, (output_x, 0), (width, self.target_height)))
+        return regions
+
+    def load(self, fp: str | bytes | Path | Image.Image):
+        # Opens (or downloads) and decodes the image, returns it together with the box to render
+        key = source_key(fp) if self.mode == "prefer_salient" else None
+        if isinstance(fp, str) and fp.startswith("http"):
+            # requests is only imported once a url is fitted, local files don't pay for the network stack
+            from .fetch import default_fetcher
+
+            # Downloaded images are decoded while they are downloaded, unless they are JPEGs
+            # that can be decoded at a reduced resolution once they are in
+            with stage("fetch") as s:
+                fp = default_fetcher().fetch_source(fp, self.box_size)
+                if isinstance(fp, Image.Image):
+                    s.record(fp)
+
+        # Image.open only reads the header, pixels are decoded on first use
+        opened = not isinstance(fp, Image.Image)
+        image = Image.open(fp) if opened else fp
+
+        # Decode only as much resolution as the output needs (never touch images passed in by the caller)
+        return image, self.prepare(image, draft=opened, key=key)
+
+    def prepare(self, image, draft=False, key=None):
+        # Returns the box to render. With draft the decoder is allowed to decode the image at a lower resolution
+        # and the image is decoded, only use it for images that haven't been loaded yet and aren't used by anyone else.
+        # key identifies the source for the prefer_salient profile cache (see source_key)
+        with stage("crop"):
+            box = self.box(image.size)
+            if draft:
+                box = draft_box(image, box, self.box_size)
+
+        if draft:
+            with stage("decode") as s:
+                image.load()
+                s.record(image)
+
+        if self.mode == "prefer_salient":
+            with stage("crop"):
+                box = salient_box(image, box, edge_profiles(image, key))
+        return box
+
+    def apply(self, image, draft=False):
+        # Fits an already opened image to the layout (see prepare for draft)
+        with traced_call():
+            return self.render(image, self.prepare(image, draft=draft))
+
+    def render(self, image, box):
+        # Resizes the box part of the image (see box) to the monitors
+        with traced_call():
+            # Only the parts of the monitors that show the image are resampled, straight from the source
+            # and then written into their place in the output once, so gaps and black bars cost no resampling
+            regions = self.regions(box)
+            parts = []
+            for source_box, position, size in regions:
+                with stage("resize") as s:
+                    part, offset = resample_region(image, source_box, size, self.resample)
+                    if part is not None:
+                        s.record(part)
+                        parts.append((part, (position[0] + offset[0], position[1] + offset[1])))
+
+            if len(parts) == 1 and parts[0][0].size == self.size:
+                # The image covers the whole output, nothing to stitch
+                return parts[0][0]
+
+            with stage("stitch") as s:
+                output = Image.new(canvas_mode(image.mode) if len(regions) == 1 else "RGB", self.size)
+                for part, position in parts:
+                    output.paste(part, position)
+                s.record(output)
+            return output
+
+    def fit(self, fp: str | bytes | Path | Image.Image, output_path=None, encoder: EncoderSettings | None = None):
+        # Opens (or downloads) the image, fits it to the layout and optionally saves it
+        with traced_call():
+            image, box = self.load(fp)
+            image = self.render(image, box)
+
+            if output_path:
+                with stage("save") as s:
+                    save_image(image, output_path, encoder)
+                    s.record(image)
+
+            return image
+
+    def __eq__(self, other):
+        return isinstance(other, LayoutPlan) and self.parameters() == other.parameters()
+
+    def __hash__(self):
+        return hash((self.resolutions, self.gaps, self.mode, self.parameters()["resample"]))
+
+    def __repr__(self):
+        return f"LayoutPlan(resolutions={list(self.resolutions)}, gaps={list(self.gaps)}, mode={self.mode!r})"
+
+
+def aspect_ratio_box(size, target_aspect_ratio, black_bars=False, prefer_center=True, prefer_left=False, prefer_right=False, prefer_top=False, prefer_bottom=False, prefer_salient=False):
+    # Returns the (x0, y0, x1, y1) part of an image of the given size that has the target aspect ratio.
+    # With black_bars the box reaches outside of the image. prefer_salient boxes are centered, move them with salient_box.
+    # Only one of the modes can be selected
+    flags = [black_bars, prefer_center, prefer_left, prefer_right, prefer_top, prefer_bottom, prefer_salient]
+    if sum([1 if p else 0 for p in flags]) != 1:
+        raise ValueError("Only one of the prefer flags should be set")
+
+    return mode_box(size, target_aspect_ratio, MODES[[bool(p) for p in flags].index(True)])
+
+
+def mode_box(size, target_aspect_ratio, mode):
+    # Same as aspect_ratio_box with the mode given by its name (one of MODES)
+    width, height = size
+    center_x = width / 2
+    center_y = height / 2
+    # First get current and target aspect ratios
+    current_aspect_ratio = width / height
+
+    if current_aspect_ratio > target_aspect_ratio:
+        # Current image is wider than target so we want to cut off one or both of the sides or add black bars to the top and bottom
+        if mode in ["prefer_top", "prefer_bottom"]:
+            raise ValueError("Can't prefer top or bottom when image is wider than target")
+
+        if mode == "black_bars":
+            new_height = width / target_aspect_ratio
+            height_diff = new_height - height
+            y0, y1 = -height_diff / 2, height + height_diff / 2
+            x0, x1 = 0, width
+        else:
+            new_width = height * target_aspect_ratio
+            y0, y1 = 0, height
+            if mode == "prefer_left":
+                x0, x1 = 0, new_width
+            elif mode == "prefer_right":
+                x0, x1 = width - new_width, width
+            else:
+                x0, x1 = center_x - (new_width / 2), center_x + (new_width / 2)
+    else:
+        # Current image is taller than target so we want to cut off the top and/or bottom or add black bars to the left and right
+        if mode in ["prefer_left", "prefer_right"]:
+            raise ValueError("Can't prefer left or right when image is taller than target")
+
+        if mode == "black_bars":
+            new_width = height * target_aspect_ratio
+            width_diff = new_width - width
+            x0, x1 = -width_diff / 2, width + width_diff / 2
+            y0, y1 = 0, height
+        else:
+            new_height = width / target_aspect_ratio
+            x0, x1 = 0, width
+            if mode == "prefer_top":
+                y0, y1 = 0, new_height
+            elif mode == "prefer_bottom":
+                y0, y1 = height - new_height, height
+            else:
+                y0, y1 = center_y - (new_height / 2), center_y + (new_height / 2)
+
+    return x0, y0, x1, y1
+
+
+def draft_box(image, box, target_size):
+    # Asks the decoder to only decode the resolution needed to resize the box to target_size
+    # (DCT scaling for JPEGs, other formats ignore it) and returns the box in the coordinates of the smaller image
+    scale_x, scale_y = draft(image, draft_size(image.size, box, target_size))
+    return scale_box(box, scale_x, scale_y)
+
+
+def draft_size(size, box, target_size):
+    # Size the whole image can be decoded at for the box to still be at least target_size
+    box_width, box_height = box[2] - box[0], box[3] - box[1]
+    return (
+        max(1, math.ceil(size[0] * target_size[0] / box_width)),
+        max(1, math.ceil(size[1] * target_size[1] / box_height))
+    )
+
+
+def draft(image, requested_size):
+    # Returns how much the decoder scaled the image down, (1, 1) for formats without draft support
+    width, height = image.size
+    drafted = image.draft(image.mode, requested_size)
+    if not drafted or drafted[1] is None:
+        return 1, 1
+
+    # Scaling factors of the draft, they are exact even if the decoded size got rounded up
+    _, draft_box = drafted
+    return draft_box[2] / width, draft_box[3] / height
+
+
+def scale_box(box, scale_x, scale_y):
+    return box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y
+
+
+def resample_box(image, box, size, resample=None):
+    # Resizes the box part of the image to size. Parts of the box that are outside of the image (black bars)
+    # are left black instead of being resampled
+    part, offset = resample_region(image, box, size, resample)
+    if part is not None and part.size == size:
+        return part
+
+    output = Image.new(canvas_mode(image.mode), size)
+    if part is not None:
+        output.paste(part, offset)
+    return output
+
+
+def canvas_mode(mode):
+    # Mode of the image the parts are pasted into. A new palette image has no palette to look the pasted indices up
+    # in and no index that is sure to be black, so palette sources are stitched in RGB (RGBA with transparency)
+    return {"P": "RGB", "PA": "RGBA"}.get(mode, mode)
+
+
+def resample_region(image, box, size, resample=None):
+    # Resizes the part of the box that is inside of the image to the size it takes up in an output of the given size.
+    # Returns it with its position in the output, or None if the box is completely outside of the image
+    clipped = clamp_box(box, image.size)
+    if all([abs(c - b) < 1e-6 for c, b in zip(clipped, box)]):
+        return image.resize(size, resample=resample, box=clipped, reducing_gap=REDUCING_GAP), (0, 0)
+
+    # Find where the part of the box that is inside of the image ends up in the output
+    scale_x = size[0] / (box[2] - box[0])
+    scale_y = size[1] / (box[3] - box[1])
+    x0 = round((clipped[0] - box[0]) * scale_x)
+    y0 = round((clipped[1] - box[1]) * scale_y)
+    x1 = round((clipped[2] - box[0]) * scale_x)
+    y1 = round((clipped[3] - box[1]) * scale_y)
+    if x1 <= x0 or y1 <= y0:
+        return None, (0, 0)
+
+    content_box = clamp_box((box[0] + x0 / scale_x, box[1] + y0 / scale_y, box[0] + x1 / scale_x, box[1] + y1 / scale_y), image.size)
+    return image.resize((x1 - x0, y1 - y0), resample=resample, box=content_box, reducing_gap=REDUCING_GAP), (x0, y0)
+
+
+def clamp_box(box, size):
+    # Floating point errors can push a box that should be inside of the image a tiny bit outside of it
+    return max(0, box[0]), max(0, box[1]), min(size[0], box[2]), min(size[1], box[3])
+
+    
\ No newline at end of file
@@ -0,0 +1,91 @@
+import math
+from pathlib import Path
+from PIL import Image
+from .encode import EncoderSettings, save_image
+from .instrument import stage, traced_call
+from .plan import REDUCING_GAP, LayoutPlan, draft, draft_size, scale_box
+from .saliency import edge_profiles, salient_box, source_key
+
+# Pillow can't reduce these modes (and resamples them with nearest neighbour anyway)
+UNREDUCIBLE_MODES = ["1", "P"]
+
+
+def render_layouts(fp: str | bytes | Path | Image.Image, plans: list[LayoutPlan], output_paths=None, encoder: EncoderSettings | None = None):
+    """
+    Fits one source to many layouts, decoding it only once. The source is decoded at the resolution
+    the most demanding layout needs and smaller layouts are resized from halved copies of it (a mip pyramid)
+    that are shared between all layouts with similar target sizes.
+    Returns the outputs in the same order as the plans and saves them to output_paths (with the encoder settings) if given.
+
+    Usage:
+        plans = [LayoutPlan([(1920, 1080)]), LayoutPlan([(2560, 1440), (2560, 1440)], gaps=[40])]
+        images = render_layouts("input.jpg", plans, output_paths=["single.png", "double.png"])
+    """
+    if output_paths is not None and len(output_paths) != len(plans):
+        raise ValueError("There should be as many output paths as plans")
+
+    with traced_call():
+        salient = any([plan.mode == "prefer_salient" for plan in plans])
+        key = source_key(fp) if salient else None
+        if isinstance(fp, str) and fp.startswith("http"):
+            from .fetch import default_fetcher
+
+            # Kept encoded if the most demanding layout can be decoded at a reduced resolution (see LayoutPlan.load)
+            with stage("fetch") as s:
+                fp = default_fetcher().fetch_source(fp, (max([p.box_size[0] for p in plans]), max([p.box_size[1] for p in plans])))
+                if isinstance(fp, Image.Image):
+                    s.record(fp)
+
+        opened = not isinstance(fp, Image.Image)
+        image = Image.open(fp) if opened else fp
+
+        with stage("crop"):
+            boxes = [plan.box(image.size) for plan in plans]
+            if opened:
+                # Decode at the resolution the most demanding layout needs
+                sizes = [draft_size(image.size, box, plan.box_size) for plan, box in zip(plans, boxes)]
+                scale_x, scale_y = draft(image, (max([s[0] for s in sizes]), max([s[1] for s in sizes])))
+                boxes = [scale_box(box, scale_x, scale_y) for box in boxes]
+
+        if opened:
+            with stage("decode") as s:
+                image.load()
+                s.record(image)
+
+        if salient:
+            with stage("crop"):
+                # The edge profiles are worked out once and shared by all layouts
+                profiles = edge_profiles(image, key)
+                boxes = [salient_box(image, box, profiles) if plan.mode == "prefer_salient" else box for plan, box in zip(plans, boxes)]
+
+        pyramid = Pyramid(image)
+        outputs = []
+        for i, (plan, box) in enumerate(zip(plans, boxes)):
+            level, factor = pyramid.level_for(box, plan.box_size)
+            output = plan.render(level, scale_box(box, 1 / factor, 1 / factor))
+            if output_paths is not None and output_paths[i]:
+                with stage("save") as s:
+                    save_image(output, output_paths[i], encoder)
+                    s.record(output)
+            outputs.append(output)
+        return outputs
+
+
+class Pyramid:
+    # Copies of an image halved in size again and again, only built once some layout needs them
+    def __init__(self, image):
+        self.levels = [image]
+
+    def level_for(self, box, target_size):
+        # Returns the smallest level that still leaves REDUCING_GAP times more pixels than the target and its scale factor,
+        # which matches the quality of resizing the full image with reducing_gap
+        scale = min((box[2] - box[0]) / target_size[0], (box[3] - box[1]) / target_size[1])
+        if self.levels[0].mode in UNREDUCIBLE_MODES or scale < 2 * REDUCING_GAP:
+            return self.levels[0], 1
+
+        level = int(math.log2(scale / REDUCING_GAP))
+        while len(self.levels) <= level:
+            with stage("resize") as s:
+                self.levels.append(self.levels[-1].reduce(2))
+                s.record(self.levels[-1])
+        return self.levels[level], 2 ** level
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image, ImageFilter
+
+# Longest side of the proxy the edge energy is worked out on, the crop only needs to be placed roughly
+# so this keeps the cost the same for any source resolution
+PROXY_SIZE = 256
+SUPERSAMPLING = 4
+# Edge profiles of this many recent sources are kept so that fitting one source to many layouts works them out once
+PROFILE_CACHE_SIZE = 256
+
+# source key -> (column profile, row profile), least recently used first
+_profiles = OrderedDict()
+_lock = threading.Lock()
+
+
+def source_key(fp):
+    # Identity of a source for the profile cache: path, size and modification time for files (Image.open takes
+    # str, bytes and Path sources as paths). None for sources that can't be identified without decoding them
+    # (Image objects, urls, file objects)
+    if isinstance(fp, (str, bytes, Path)) and not os.fsdecode(fp).startswith("http"):
+        stat = os.stat(fp)
+        return str(Path(os.fsdecode(fp)).resolve()), stat.st_size, stat.st_mtime_ns
+    return None
+
+
+def edge_profiles(image, key=None):
+    """
+    Edge energy of the image summed up per column and per row, worked out on a small proxy of the image.
+    These are the one dimensional integral images of the energy map: the energy of any full height (or full width)
+    window is the sum of a slice of a profile. Profiles are cached by key (see source_key).
+    """
+    if key is not None:
+        with _lock:
+            if key in _profiles:
+                _profiles.move_to_end(key)
+                return _profiles[key]
+
+    scale = min(1, PROXY_SIZE / max(image.size))
+    proxy_size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    # Point sample a few times the proxy size first and average that down, so that the cost doesn't grow with
+    # the source and fine detail still shows up as edges
+    sample_size = (min(image.size[0], proxy_size[0] * SUPERSAMPLING), min(image.size[1], proxy_size[1] * SUPERSAMPLING))
+    proxy = image.resize(sample_size, Image.Resampling.NEAREST).resize(proxy_size, Image.Resampling.BOX).convert("L")
+    energy = proxy.filter(ImageFilter.FIND_EDGES).convert("F")
+    # Pillow averages every column (row) down to a single pixel, no per pixel loop in Python
+    columns = energy.resize((proxy_size[0], 1), Image.Resampling.BOX)
+    columns = [columns.getpixel((x, 0)) for x in range(proxy_size[0])]
+    rows = energy.resize((1, proxy_size[1]), Image.Resampling.BOX)
+    rows = [rows.getpixel((0, y)) for y in range(proxy_size[1])]
+    # FIND_EDGES leaves the outermost pixels out, don't let them count against windows touching the border
+    columns[0], columns[-1] = columns[min(1, len(columns) - 1)], columns[max(0, len(columns) - 2)]
+    rows[0], rows[-1] = rows[min(1, len(rows) - 1)], rows[max(0, len(rows) - 2)]
+    profiles = (columns, rows)
+
+    if key is not None:
+        with _lock:
+            _profiles[key] = profiles
+            while len(_profiles) > PROFILE_CACHE_SIZE:
+                _profiles.popitem(last=False)
+    return profiles
+
+
+def salient_box(image, box, profiles=None):
+    # Moves the crop box (which has to be inside of the image) to the part of the image with the most edge energy,
+    # along the axis the image is cropped in. Equally good positions are resolved towards the center
+    if profiles is None:
+        profiles = edge_profiles(image)
+    columns, rows = profiles
+    width, height = image.size
+    box_width, box_height = box[2] - box[0], box[3] - box[1]
+
+    if box_width < width - 1e-6:
+        x0 = best_window(columns, box_width / width) * width
+        x0 = min(max(0, x0), width - box_width)
+        return x0, box[1], x0 + box_width, box[3]
+    if box_height < height - 1e-6:
+        y0 = best_window(rows, box_height / height) * height
+        y0 = min(max(0, y0), height - box_height)
+        return box[0], y0, box[2], y0 + box_height
+    return box
+
+
+def best_window(profile, fraction):
+    # Start (as a fraction of the profile length) of the window covering the given fraction of the profile
+    # with the largest sum
+    length = len(profile)
+    window = min(length, max(1, round(fraction * length)))
+    prefix = [0.0]
+    for value in profile:
+        prefix.append(prefix[-1] + value)
+
+    center = (length - window) / 2
+    best_start, best_sum = 0, None
+    for start in range(length - window + 1):
+        window_sum = prefix[start + window] - prefix[start]
+        if best_sum is None or window_sum > best_sum + 1e-9 or (abs(window_sum - best_sum) <= 1e-9 and abs(start - center) < abs(best_start - center)):
+            best_start, best_sum = start, window_sum
+
+    # Uniform images (or ones where the window fits twice over equally well) stay centered
+    if best_sum is not None and abs(best_sum - (prefix[round(center) + window] - prefix[round(center)])) <= 1e-9:
+        best_start = center
+    return best_start / length
@@ -0,0 +1,440 @@
+import hashlib
+import io
+import multiprocessing
+import pickle
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+from PIL import Image
+from .batch import _picklable
+from .encode import EncoderSettings, save_image
+from .plan import LayoutPlan, draft, draft_size
+from .saliency import source_key
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# How often idle worker threads and waiting requests check whether the server was closed (seconds)
+WORKER_CHECK_INTERVAL = 0.5
+# Seconds close waits for the jobs the workers are busy with before terminating them
+CLOSE_TIMEOUT = 5
+# Connections waiting to be accepted, clients connecting beyond this block until the server gets to them
+LISTEN_BACKLOG = 64
+
+
+class FitServer:
+    """
+    Long running fitting service for local clients (see FitClient). Worker processes stay up between requests
+    so imports are paid once, and every worker keeps recently decoded sources in memory (up to cache_bytes)
+    so fitting a hot source to another layout skips the decode.
+
+    Requests wait in a queue of at most queue_size jobs. Once it's full new requests block for submit_timeout
+    seconds (forever if None) and are then rejected with queue.Full, so callers feel the backpressure instead of
+    the server piling up work. Fitted images are handed back in shared memory blocks, not pickled.
+
+    Usage:
+        with FitServer(workers=4) as server:
+            with FitClient(server.address, server.authkey) as client:
+                image = client.fit("input.jpg", LayoutPlan([(1920, 1080)]))
+    """
+
+    def __init__(self, address=None, workers=2, queue_size=16, cache_bytes=DEFAULT_CACHE_BYTES, authkey: bytes | None = None, submit_timeout=None):
+        if workers < 1:
+            raise ValueError("workers should be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size should be at least 1")
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.submit_timeout = submit_timeout
+        # Requests are pickled, never accept connections from clients that don't know the key
+        self.authkey = authkey or secrets.token_bytes(32)
+
+        # Workers are spawned so that they don't inherit the threads of the server
+        self._context = multiprocessing.get_context("spawn")
+        # (fp, plan, queue the reply is handed to the waiting connection through)
+        self._jobs = queue.Queue(queue_size)
+        self._listener = Listener(address, backlog=LISTEN_BACKLOG, authkey=self.authkey)
+        self.address = self._listener.address
+
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._processes = set()
+        self._threads = []
+        self._closed = threading.Event()
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cache_hits": 0, "outstanding": 0, "running": 0}
+
+    def start(self):
+        # Every worker process is driven by a thread of its own, see _drive
+        targets = [self._accept] + [self._drive] * self.workers
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True, name=f"wallfit-service-{target.__name__[1:]}")
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stats(self):
+        # Request counters, running is the number of jobs the workers are busy with and outstanding
+        # the number of result blocks clients haven't released yet
+        with self._lock:
+            stats = dict(self._counts)
+        stats["queued"] = self._jobs.qsize()
+        return stats
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        # Wake up the accept loop, it checks whether the server was closed after every connection. No authkey so that
+        # the connection doesn't wait for a handshake when the loop already stopped on its own
+        try:
+            Client(self.address).close()
+        except OSError:
+            pass
+        self._listener.close()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close()
+
+        # The driving threads finish the jobs the workers are busy with and stop their workers,
+        # workers that don't finish in time are terminated (their jobs fail)
+        deadline = time.monotonic() + CLOSE_TIMEOUT
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            process.terminate()
+        for thread in self._threads:
+            thread.join()
+
+        # Nobody is going to answer the requests that are still queued
+        while True:
+            try:
+                _, _, reply = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            reply.put(("error", RuntimeError("The server was closed")))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_worker(self):
+        # Every worker gets a pipe of its own, the driving thread knows which job it sent down the pipe
+        # so a worker that dies can never take a job with it unnoticed
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=_worker, args=(worker_connection, self.cache_bytes), daemon=True, name="wallfit-worker")
+        process.start()
+        # Only the worker holds its end now, the pipe reports EOF as soon as the worker is gone
+        worker_connection.close()
+        with self._lock:
+            self._processes.add(process)
+        return process, connection
+
+    def _stop_worker(self, process, connection):
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        connection.close()
+        with self._lock:
+            self._processes.discard(process)
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                # Closed, or a client that failed the authentication
+                continue
+            if self._closed.is_set():
+                connection.close()
+                break
+            with self._lock:
+                self._connections.add(connection)
+            thread = threading.Thread(target=self._handle, args=(connection,), daemon=True, name="wallfit-service-connection")
+            thread.start()
+
+    def _handle(self, connection):
+        # Serves the requests of one client, one at a time
+        outstanding = set()
+        try:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    break
+                if request[0] == "fit":
+                    reply = self._fit(request[1], request[2])
+                    if reply[0] == "ok":
+                        outstanding.add(reply[1])
+                    connection.send(reply)
+                elif request[0] == "release":
+                    # The client copied the result and unlinked the block
+                    outstanding.discard(request[1])
+                    with self._lock:
+                        self._counts["outstanding"] -= 1
+                elif request[0] == "stats":
+                    connection.send(("stats", self.stats()))
+                else:
+                    connection.send(("error", ValueError(f"Unknown request {request[0]!r}")))
+        except OSError:
+            pass
+        finally:
+            connection.close()
+            with self._lock:
+                self._connections.discard(connection)
+                self._counts["outstanding"] -= len(outstanding)
+            # Free the results a disconnected client never picked up
+            for name in outstanding:
+                _unlink_block(name)
+
+    def _fit(self, fp, plan):
+        if isinstance(fp, Image.Image):
+            return "error", ValueError("FitServer expects file paths, urls or bytes, not Image objects")
+        if not isinstance(plan, LayoutPlan):
+            return "error", ValueError("plan should be a LayoutPlan")
+        if self._closed.is_set():
+            return "error", RuntimeError("The server was closed")
+
+        reply = queue.Queue(1)
+        try:
+            self._jobs.put((fp, plan, reply), timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._counts["rejected"] += 1
+            return "error", queue.Full("The fitting queue is full, try again later")
+        with self._lock:
+            self._counts["submitted"] += 1
+        while True:
+            try:
+                return reply.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                # Submitted while the server was being closed, after the queue was emptied
+                if self._closed.is_set() and not any([thread.is_alive() for thread in self._threads]):
+                    try:
+                        return reply.get_nowait()
+                    except queue.Empty:
+                        return "error", RuntimeError("The server was closed")
+
+    def _drive(self):
+        # Hands queued jobs to one worker process and its replies back to the waiting connections.
+        # A worker that dies fails the job it was working on and is replaced
+        process, connection = self._start_worker()
+        try:
+            while not self._closed.is_set():
+                try:
+                    fp, plan, reply = self._jobs.get(timeout=WORKER_CHECK_INTERVAL)
+                except queue.Empty:
+                    continue
+
+                with self._lock:
+                    self._counts["running"] += 1
+                try:
+                    connection.send((fp, plan))
+                    result, cache_hit = connection.recv()
+                except (EOFError, OSError):
+                    process.join(timeout=5)
+                    result, cache_hit = ("error", RuntimeError(f"The worker fitting the image exited with code {process.exitcode}")), False
+                    self._stop_worker(process, connection)
+                    # Replaced unless the server is being closed, the loop ends then
+                    process, connection = (None, None) if self._closed.is_set() else self._start_worker()
+
+                with self._lock:
+                    self._counts["running"] -= 1
+                    self._counts["completed" if result[0] == "ok" else "failed"] += 1
+                    self._counts["cache_hits"] += int(cache_hit)
+                    if result[0] == "ok":
+                        self._counts["outstanding"] += 1
+                reply.put(result)
+        finally:
+            if process is not None:
+                self._stop_worker(process, connection)
+
+
+class FitClient:
+    """
+    Connection to a FitServer. A client can be shared between threads, its requests are sent one at a time.
+
+    Usage:
+        with FitClient(address, authkey) as client:
+            image = client.fit("input.jpg", plan, output_path="output.png")
+    """
+
+    def __init__(self, address, authkey: bytes | None = None):
+        self._connection = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+
+    def fit(self, fp, plan: LayoutPlan, output_path=None, encoder: EncoderSettings | None = None):
+        # Fits the source (path, url or bytes) on the server, raises the error the worker ran into
+        with self._lock:
+            self._connection.send(("fit", fp, plan))
+            reply = self._connection.recv()
+            if reply[0] == "error":
+                raise reply[1]
+
+            _, name, mode, size, length, info = reply
+            block = shared_memory.SharedMemory(name)
+            try:
+                with block.buf[:length] as data:
+                    image = Image.frombytes(mode, size, data)
+            finally:
+                block.close()
+                block.unlink()
+                self._connection.send(("release", name))
+            if info["palette"] is not None:
+                image.putpalette(info["palette"][1], info["palette"][0])
+            image.info.update(info["info"])
+
+        if output_path:
+            save_image(image, output_path, encoder)
+        return image
+
+    def stats(self):
+        with self._lock:
+            self._connection.send(("stats",))
+            return self._connection.recv()[1]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DecodedCache:
+    # Decoded sources of a worker, key -> (image, size of the source), least recently used first
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, image, source_size):
+        self.pop(key)
+        size = image.size[0] * image.size[1] * len(image.getbands())
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (image, source_size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._size -= evicted.size[0] * evicted.size[1] * len(evicted.getbands())
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[0].size[0] * entry[0].size[1] * len(entry[0].getbands())
+
+
+def _worker(connection, cache_bytes):
+    cache = DecodedCache(cache_bytes)
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fp, plan = job
+        try:
+            image, cache_hit = _fit_cached(fp, plan, cache)
+            data = image.tobytes()
+            name = _create_block(data)
+            connection.send((("ok", name, image.mode, image.size, len(data), _image_info(image)), cache_hit))
+        except Exception as e:
+            connection.send((("error", _picklable(e)), False))
+
+
+def _image_info(image):
+    # What Image.frombytes doesn't restore from the pixels: the palette of P images and the info dict (transparency)
+    palette = None
+    if image.mode in ["P", "PA"] and image.palette is not None:
+        palette = (image.palette.mode, image.getpalette(image.palette.mode))
+    return {"palette": palette, "info": _picklable_info(image.info)}
+
+
+def _picklable_info(info):
+    picklable = {}
+    for key, value in info.items():
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        picklable[key] = value
+    return picklable
+
+
+def _source_key(fp):
+    # Unlike Image.open the service reads bytes as the encoded image itself, they are identified by a content hash
+    if isinstance(fp, bytes):
+        return hashlib.sha256(fp).hexdigest()
+    return source_key(fp)
+
+
+def _fit_cached(fp, plan, cache):
+    # Fits the source, reusing its decoded pixels if they were decoded at a high enough resolution before
+    key = _source_key(fp)
+    if key is None:
+        # Urls are cached and revalidated by the fetcher
+        return plan.fit(fp), False
+
+    entry = cache.get(key)
+    cache_hit = False
+    if entry is not None:
+        image, source_size = entry
+        needed = draft_size(source_size, plan.box(source_size), plan.box_size)
+        cache_hit = image.size == source_size or (image.size[0] >= needed[0] and image.size[1] >= needed[1])
+
+    if not cache_hit:
+        image = Image.open(io.BytesIO(fp) if isinstance(fp, bytes) else fp)
+        source_size = image.size
+        # Decode only as much resolution as this layout needs, a layout that needs more decodes the source again
+        draft(image, draft_size(source_size, plan.box(source_size), plan.box_size))
+        image.load()
+        cache.put(key, image, source_size)
+
+    return plan.render(image, plan.prepare(image, key=key)), cache_hit
+
+
+def _create_block(data):
+    # Copies the data into a new shared memory block that the client unlinks once it has read it.
+    # Blocks outlive the process that created them on POSIX systems only, the service doesn't run on Windows
+    if sys.version_info >= (3, 13):
+        block = shared_memory.SharedMemory(create=True, size=len(data), track=False)
+    else:
+        block = shared_memory.SharedMemory(create=True, size=len(data))
+        # The worker doesn't own the block, don't let the resource tracker remove it
+        resource_tracker.unregister(block._name, "shared_memory")
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return name
+
+
+def _unlink_block(name):
+    try:
+        block = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        # Already released
+        return
+    block.close()
+    block.unlink()
@@ -0,0 +1,196 @@
+import math
+from pathlib import Path
+from PIL import Image, ImageFile
+from .encode import EncoderSettings, save_image
+from .instrument import stage, traced_call
+from .plan import LayoutPlan, draft_box, resample_region
+
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+# Modes whose pixels can be decoded straight into a strip without any palette or conversion
+STRIP_MODES = ["1", "L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F", "I;16"]
+
+# Bits per pixel of raw modes, used to work out the row length when the file doesn't specify it
+RAW_BITS = {"1": 1, "L": 8, "LA": 16, "RGB": 24, "RGBA": 32, "RGBX": 32, "CMYK": 32, "I": 32, "F": 32, "I;16": 16}
+
+# Extra source rows/columns read around every strip so that the resampling filter sees the same neighbours
+# it would in the full image (the widest filter, Lanczos, reaches 3 pixels out)
+FILTER_SUPPORT = 3
+
+
+def tiled_fit(fp: str | bytes | Path, plan: LayoutPlan, output_path=None, max_memory=DEFAULT_MAX_MEMORY, encoder: EncoderSettings | None = None):
+    """
+    Same as plan.fit but reads the source in horizontal strips and resamples every strip straight into the output,
+    so that memory use depends on the output size and max_memory instead of the size of the source.
+
+    Strips can be read from images stored as independent strips or tiles (uncompressed TIFF)
+    or as plain uncompressed rows (BMP, PPM). Other formats are decoded as a whole (JPEGs at a reduced resolution)
+    as long as that fits into max_memory, otherwise a ValueError is raised.
+    """
+    if isinstance(fp, Image.Image) or (isinstance(fp, str) and fp.startswith("http")):
+        # Already decoded or has to be downloaded as a whole anyway
+        return plan.fit(fp, output_path=output_path, encoder=encoder)
+
+    with traced_call():
+        return _tiled_fit(fp, plan, output_path, max_memory, encoder)
+
+
+def _tiled_fit(fp, plan, output_path, max_memory, encoder):
+    image = Image.open(fp)
+    with stage("crop"):
+        box = plan.box(image.size)
+        regions = plan.regions(box)
+    output_mode = image.mode if len(regions) == 1 else "RGB"
+    output_bytes = plan.size[0] * plan.size[1] * pixel_bytes(output_mode)
+    available = max_memory - output_bytes
+    if available <= 0:
+        raise ValueError(f"max_memory ({max_memory} bytes) is smaller than the output ({output_bytes} bytes)")
+
+    # Strips are resampled into full width rows of the output, which needs all monitors side by side in one row.
+    # prefer_salient needs to see the whole image before the box can be placed
+    in_one_row = all([(r[0][1], r[0][3], r[1][1], r[2][1]) == (box[1], box[3], 0, plan.box_size[1]) for r in regions])
+    tiles = strip_tiles(image) if in_one_row and plan.mode != "prefer_salient" else None
+    if tiles is None:
+        # Can't be read in strips, decode it at the lowest resolution the output allows if that fits
+        draft_box(image, box, plan.box_size)
+        needed = image.size[0] * image.size[1] * pixel_bytes(image.mode)
+        if needed > available:
+            raise ValueError(f"{image.format} images can't be read in strips and decoding this one needs {needed} bytes, more than max_memory allows")
+        with stage("decode") as s:
+            image.load()
+            s.record(image)
+        output = plan.apply(image, draft=False)
+        if output_path:
+            with stage("save") as s:
+                save_image(output, output_path, encoder)
+                s.record(output)
+        return output
+
+    width, height = image.size
+    out_height = plan.box_size[1]
+    scale_y = (box[3] - box[1]) / out_height
+    margin = math.ceil(FILTER_SUPPORT * max(scale_y, 1)) + 1
+    tile_height = max([t[1][3] - t[1][1] for t in tiles])
+
+    # Output rows per strip, half of the memory is kept for the resampling buffers
+    row_bytes = width * pixel_bytes(image.mode)
+    rows_per_strip = math.floor((available / 2 / row_bytes - 2 * margin - tile_height) / scale_y)
+    if rows_per_strip < 1:
+        raise ValueError(f"max_memory ({max_memory} bytes) is too small to read {width}px wide strips")
+
+    # Columns of the source that are needed at all (narrower than the image when cropping the sides)
+    left = max(0, math.floor(box[0]) - margin)
+    right = min(width, math.ceil(box[2]) + margin)
+
+    with stage("stitch") as s:
+        output = Image.new(output_mode, plan.size)
+        s.record(output)
+    for r0 in range(0, out_height, rows_per_strip):
+        r1 = min(out_height, r0 + rows_per_strip)
+        source_y0 = box[1] + r0 * scale_y
+        source_y1 = box[1] + r1 * scale_y
+        top = max(0, math.floor(source_y0) - margin)
+        bottom = min(height, math.ceil(source_y1) + margin)
+        if bottom <= top:
+            # Only black bars in these rows
+            continue
+
+        with stage("decode") as s:
+            strip, (strip_x, strip_y) = load_strip(image, tiles, (left, top, right, bottom))
+            s.record(strip)
+        for source_box, position, size in regions:
+            strip_box = (source_box[0] - strip_x, source_y0 - strip_y, source_box[2] - strip_x, source_y1 - strip_y)
+            with stage("resize") as s:
+                part, offset = resample_region(strip, strip_box, (size[0], r1 - r0), plan.resample)
+                if part is None:
+                    continue
+                s.record(part)
+            with stage("stitch"):
+                output.paste(part, (position[0] + offset[0], position[1] + r0 + offset[1]))
+        del strip
+
+    if output_path:
+        with stage("save") as s:
+            save_image(output, output_path, encoder)
+            s.record(output)
+    return output
+
+
+def strip_tiles(image):
+    # Returns tiles that can be decoded independently of each other or None if the image can't be read in strips
+    if image.mode not in STRIP_MODES or not image.tile:
+        return None
+    # Strips are decoded with the decoder factory ImageFile.load uses, it isn't public.
+    # Should a Pillow release drop it the sources are decoded as a whole instead
+    if not hasattr(Image, "_getdecoder"):
+        return None
+
+    if len(image.tile) > 1:
+        # Stored as strips or tiles (uncompressed TIFF)
+        return list(image.tile)
+
+    codec, extents, offset, args = image.tile[0]
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    if codec != "raw" or len(args) < 3 or args[2] not in [1, -1]:
+        return None
+
+    # A single block of raw rows can be cut into tiles of any height
+    rawmode, stride, orientation = args[:3]
+    width, height = extents[2] - extents[0], extents[3] - extents[1]
+    if stride == 0:
+        if rawmode not in RAW_BITS:
+            return None
+        stride = (width * RAW_BITS[rawmode] + 7) // 8
+    rows = 16
+    tiles = []
+    for y in range(0, height, rows):
+        y1 = min(height, y + rows)
+        # Bottom up images (BMP) store the last row first
+        row_offset = offset + (y if orientation == 1 else height - y1) * stride
+        # Plain (codec, extents, offset, args) tuples like the ones Pillow keeps in image.tile
+        tiles.append((codec, (extents[0], extents[1] + y, extents[2], extents[1] + y1), row_offset, (rawmode, stride, orientation)))
+    return tiles
+
+
+def load_strip(image, tiles, area):
+    # Decodes the tiles that overlap the area into a new image.
+    # Returns the image and the position of its top left corner in the source
+    selected = [t for t in tiles if t[1][0] < area[2] and t[1][2] > area[0] and t[1][1] < area[3] and t[1][3] > area[1]]
+    left = min([t[1][0] for t in selected])
+    top = min([t[1][1] for t in selected])
+    right = max([t[1][2] for t in selected])
+    bottom = max([t[1][3] for t in selected])
+
+    strip = Image.new(image.mode, (right - left, bottom - top))
+    fp = image.fp
+    prefix = getattr(image, "tile_prefix", b"")
+    for codec, extents, offset, args in sorted(selected, key=lambda t: t[2]):
+        fp.seek(offset)
+        decoder = Image._getdecoder(image.mode, codec, args, image.decoderconfig)
+        try:
+            decoder.setimage(strip.im, (extents[0] - left, extents[1] - top, extents[2] - left, extents[3] - top))
+            if decoder.pulls_fd:
+                decoder.setfd(fp)
+                err_code = decoder.decode(b"")[1]
+            else:
+                data = prefix
+                while True:
+                    chunk = fp.read(ImageFile.MAXBLOCK)
+                    if not chunk:
+                        raise OSError("image file is truncated")
+                    data += chunk
+                    consumed, err_code = decoder.decode(data)
+                    if consumed < 0:
+                        break
+                    data = data[consumed:]
+        finally:
+            decoder.cleanup()
+        if err_code < 0:
+            raise OSError(f"decoder error {err_code} while reading a strip")
+    return strip, (left, top)
+
+
+def pixel_bytes(mode):
+    # Pillow keeps multi band pixels in 4 bytes
+    return 1 if mode in ["1", "L", "P"] else 4